@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 from typing import List, Optional
 import sqlite3
 from auth import get_current_user
+import idempotency
 
 router = APIRouter(prefix="/api")
 
@@ -45,18 +46,45 @@ async def get_addresses(current_user: dict = Depends(get_current_user)):
     finally:
         conn.close()
 
+MAX_IMPORT_ADDRESSES = 500
+
+def _clear_default(cursor: sqlite3.Cursor, user_id: int):
+    # idx_addresses_single_default allows one default per user, so this touches at most one row
+    cursor.execute('''
+        UPDATE addresses 
+        SET is_default = 0 
+        WHERE user_id = ? AND is_default = 1
+    ''', (user_id,))
+
 @router.post("/address")
-async def create_address(address: AddressBase, current_user: dict = Depends(get_current_user)):
+async def create_address(
+    address: AddressBase,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    if idempotency_key:
+        principal = idempotency.principal_of(current_user)
+        request_fingerprint = idempotency.fingerprint("create_address", address.model_dump())
+        replay = idempotency.recall(principal, idempotency_key, request_fingerprint)
+        if replay is not None:
+            return replay
+    
+    conn = sqlite3.connect('services.db')
     try:
-        conn = sqlite3.connect('services.db')
         cursor = conn.cursor()
+        # One write transaction, so concurrent requests can't both leave a default
+        cursor.execute('BEGIN IMMEDIATE')
+        
+        if idempotency_key:
+            # Under the write lock, so a concurrent retry waits and then sees our response
+            replay = idempotency.lookup(cursor, principal, idempotency_key, request_fingerprint)
+            if replay is not None:
+                conn.rollback()
+                idempotency.remember(principal, idempotency_key, request_fingerprint, replay)
+                return replay
         
         if address.is_default:
-            cursor.execute('''
-                UPDATE addresses 
-                SET is_default = 0 
-                WHERE user_id = ?
-            ''', (current_user["user_id"],))
+            _clear_default(cursor, current_user["user_id"])
         
         cursor.execute('''
             INSERT INTO addresses (user_id, type, address, city, is_default)
@@ -70,9 +98,7 @@ async def create_address(address: AddressBase, current_user: dict = Depends(get_
         ))
         
         address_id = cursor.lastrowid
-        conn.commit()
-        
-        return {
+        response = {
             "id": address_id,
             "user_id": current_user["user_id"],
             "type": address.type,
@@ -80,6 +106,54 @@ async def create_address(address: AddressBase, current_user: dict = Depends(get_
             "city": address.city,
             "is_default": address.is_default
         }
+        
+        if idempotency_key:
+            idempotency.store(cursor, principal, idempotency_key, request_fingerprint, response)
+        conn.commit()
+        
+        if idempotency_key:
+            idempotency.remember(principal, idempotency_key, request_fingerprint, response)
+        return response
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+@router.post("/address/bulk")
+async def import_addresses(
+    addresses: List[AddressBase],
+    current_user: dict = Depends(get_current_user)
+):
+    if len(addresses) > MAX_IMPORT_ADDRESSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_IMPORT_ADDRESSES} addresses can be imported at once"
+        )
+    if sum(1 for a in addresses if a.is_default) > 1:
+        raise HTTPException(status_code=400, detail="Only one address can be the default")
+    
+    conn = sqlite3.connect('services.db')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        
+        if any(a.is_default for a in addresses):
+            _clear_default(cursor, current_user["user_id"])
+        
+        cursor.executemany('''
+            INSERT INTO addresses (user_id, type, address, city, is_default)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (current_user["user_id"], a.type, a.address, a.city, a.is_default)
+            for a in addresses
+        ])
+        
+        conn.commit()
+        return {"imported": len(addresses)}
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         conn.close()
 
@@ -89,37 +163,31 @@ async def update_address(
     address: AddressBase,
     current_user: dict = Depends(get_current_user)
 ):
+    conn = sqlite3.connect('services.db')
     try:
-        conn = sqlite3.connect('services.db')
         cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id FROM addresses 
-            WHERE id = ? AND user_id = ?
-        ''', (address_id, current_user["user_id"]))
-        
-        if not cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Address not found")
+        cursor.execute('BEGIN IMMEDIATE')
         
         if address.is_default:
-            cursor.execute('''
-                UPDATE addresses 
-                SET is_default = 0 
-                WHERE user_id = ? AND id != ?
-            ''', (current_user["user_id"], address_id))
+            _clear_default(cursor, current_user["user_id"])
         
+        # Scoped to the user, so no separate ownership check is needed
         cursor.execute('''
             UPDATE addresses 
             SET type = ?, address = ?, city = ?, is_default = ?
-            WHERE id = ?
+            WHERE id = ? AND user_id = ?
         ''', (
             address.type,
             address.address,
             address.city,
             address.is_default,
-            address_id
+            address_id,
+            current_user["user_id"]
         ))
         
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Address not found")
+        
         conn.commit()
         
         return {
@@ -130,16 +198,20 @@ async def update_address(
             "city": address.city,
             "is_default": address.is_default
         }
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         conn.close()
 
 @router.delete("/address/{address_id}")
 async def delete_address(address_id: int, current_user: dict = Depends(get_current_user)):
+    conn = sqlite3.connect('services.db')
     try:
-        conn = sqlite3.connect('services.db')
         cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
         
-        # First check if the address exists and get its default status
+        # Check the address exists and get its default status
         cursor.execute('''
             SELECT is_default FROM addresses 
             WHERE id = ? AND user_id = ?
@@ -149,28 +221,33 @@ async def delete_address(address_id: int, current_user: dict = Depends(get_curre
         if not address:
             raise HTTPException(status_code=404, detail="Address not found")
         
-        was_default = address[0]
-        
         # Delete the address
         cursor.execute('''
             DELETE FROM addresses 
-            WHERE id = ? AND user_id = ?
-        ''', (address_id, current_user["user_id"]))
+            WHERE id = ?
+        ''', (address_id,))
         
-        if was_default:
-            # If the deleted address was default, set a new default
+        if address[0]:
+            # If the deleted address was default, the newest remaining one takes over
             cursor.execute('''
                 UPDATE addresses 
                 SET is_default = 1 
-                WHERE user_id = ? 
-                ORDER BY id DESC 
-                LIMIT 1
+                WHERE id = (
+                    SELECT id FROM addresses 
+                    WHERE user_id = ? 
+                    ORDER BY id DESC 
+                    LIMIT 1
+                )
             ''', (current_user["user_id"],))
         
         conn.commit()
         return {"message": "Address deleted successfully"}
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
+        conn.rollback()
         print(f"Error deleting address: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
@@ -0,0 +1,140 @@
+from fastapi import APIRouter, HTTPException, Depends
+from datetime import date
+from typing import Optional
+import sqlite3
+from auth import get_current_admin
+import tasks
+import profile_cache
+import backup
+
+router = APIRouter(prefix="/api/admin", dependencies=[Depends(get_current_admin)])
+
+REVENUE_STATUS = "completed"
+
+TOP_DIMENSIONS = {
+    "category": ("category_id", "categories"),
+    "provider": ("provider_id", "service_providers")
+}
+
+def _rollup_filter(
+    start: Optional[date],
+    end: Optional[date],
+    category_id: Optional[int] = None,
+    provider_id: Optional[int] = None
+):
+    clauses, params = [], []
+    if start:
+        clauses.append("r.day >= ?")
+        params.append(start.isoformat())
+    if end:
+        clauses.append("r.day <= ?")
+        params.append(end.isoformat())
+    if category_id is not None:
+        clauses.append("r.category_id = ?")
+        params.append(category_id)
+    if provider_id is not None:
+        clauses.append("r.provider_id = ?")
+        params.append(provider_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+@router.get("/analytics/timeseries")
+async def get_booking_timeseries(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    category_id: Optional[int] = None,
+    provider_id: Optional[int] = None
+):
+    where, params = _rollup_filter(start, end, category_id, provider_id)
+    conn = sqlite3.connect('services.db')
+    try:
+        c = conn.cursor()
+        # Revenue only counts completed bookings, counts include every status
+        c.execute(f'''
+            SELECT r.day,
+                   SUM(r.booking_count),
+                   SUM(CASE WHEN r.status = ? THEN r.booking_count ELSE 0 END),
+                   SUM(CASE WHEN r.status = ? THEN r.revenue ELSE 0 END)
+            FROM booking_rollups r
+            {where}
+            GROUP BY r.day
+            ORDER BY r.day
+        ''', [REVENUE_STATUS, REVENUE_STATUS] + params)
+
+        return [
+            {
+                "day": row[0],
+                "bookings": row[1],
+                "completed": row[2],
+                "revenue": row[3]
+            }
+            for row in c.fetchall()
+        ]
+    finally:
+        conn.close()
+
+@router.get("/analytics/top")
+async def get_top_breakdown(
+    by: str = "category",
+    metric: str = "revenue",
+    limit: int = 10,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    if by not in TOP_DIMENSIONS:
+        raise HTTPException(status_code=400, detail="by must be category or provider")
+    if metric not in ("revenue", "bookings"):
+        raise HTTPException(status_code=400, detail="metric must be revenue or bookings")
+
+    column, table = TOP_DIMENSIONS[by]
+    where, params = _rollup_filter(start, end)
+    order = "revenue" if metric == "revenue" else "bookings"
+
+    conn = sqlite3.connect('services.db')
+    try:
+        c = conn.cursor()
+        c.execute(f'''
+            SELECT totals.key, t.name, totals.bookings, totals.revenue
+            FROM (
+                SELECT r.{column} AS key,
+                       SUM(r.booking_count) AS bookings,
+                       SUM(CASE WHEN r.status = ? THEN r.revenue ELSE 0 END) AS revenue
+                FROM booking_rollups r
+                {where}
+                GROUP BY r.{column}
+                ORDER BY {order} DESC
+                LIMIT ?
+            ) totals
+            LEFT JOIN {table} t ON t.id = totals.key
+            ORDER BY totals.{order} DESC
+        ''', [REVENUE_STATUS] + params + [max(1, min(limit, 100))])
+
+        return [
+            {
+                "id": row[0],
+                "name": row[1],
+                "bookings": row[2],
+                "revenue": row[3]
+            }
+            for row in c.fetchall()
+        ]
+    finally:
+        conn.close()
+
+@router.get("/tasks/metrics")
+async def get_task_metrics():
+    return tasks.queue_metrics()
+
+@router.get("/cache/metrics")
+async def get_cache_metrics():
+    return {"profiles": profile_cache.metrics()}
+
+@router.post("/backup", status_code=202)
+async def start_backup():
+    if not backup.start_backup():
+        raise HTTPException(status_code=409, detail="A backup is already running")
+    return backup.progress()
+
+@router.get("/backup")
+async def get_backup_progress():
+    return backup.progress()
@@ -0,0 +1,70 @@
+from typing import Optional
+import sqlite3
+import sys
+
+# One row per (day, category, provider, status); bookings move between rows as
+# their status changes, so reports never have to scan the bookings table
+UPSERT_ROLLUP_SQL = '''
+    INSERT INTO booking_rollups (day, category_id, provider_id, status, booking_count, revenue)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(day, category_id, provider_id, status) DO UPDATE SET
+        booking_count = booking_count + excluded.booking_count,
+        revenue = revenue + excluded.revenue
+'''
+
+def apply_booking_status_change(
+    cursor: sqlite3.Cursor,
+    booking_id: int,
+    old_status: Optional[str],
+    new_status: Optional[str]
+):
+    """Move a booking between rollup rows; call inside the transaction that changes it.
+
+    Pass old_status=None for a new booking and new_status=None for a deleted one.
+    """
+    cursor.execute('''
+        SELECT date(b.created_at), COALESCE(s.category_id, 0), b.provider_id, COALESCE(s.price, 0)
+        FROM bookings b
+        LEFT JOIN services s ON b.service_id = s.id
+        WHERE b.id = ?
+    ''', (booking_id,))
+    row = cursor.fetchone()
+    if not row:
+        return
+
+    day, category_id, provider_id, price = row
+    if old_status:
+        cursor.execute(UPSERT_ROLLUP_SQL, (day, category_id, provider_id, old_status, -1, -price))
+    if new_status:
+        cursor.execute(UPSERT_ROLLUP_SQL, (day, category_id, provider_id, new_status, 1, price))
+
+def backfill(conn: sqlite3.Connection):
+    """Rebuild booking_rollups from scratch."""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('DELETE FROM booking_rollups')
+        cursor.execute('''
+            INSERT INTO booking_rollups (day, category_id, provider_id, status, booking_count, revenue)
+            SELECT date(b.created_at), COALESCE(s.category_id, 0), b.provider_id, b.status,
+                   COUNT(*), COALESCE(SUM(s.price), 0)
+            FROM bookings b
+            LEFT JOIN services s ON b.service_id = s.id
+            GROUP BY 1, 2, 3, 4
+        ''')
+        conn.commit()
+        return cursor.rowcount
+    except Exception:
+        conn.rollback()
+        raise
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        print("Usage: python analytics.py backfill")
+        sys.exit(1)
+
+    conn = sqlite3.connect('services.db')
+    try:
+        print(f"Rebuilt {backfill(conn)} rollup rows")
+    finally:
+        conn.close()
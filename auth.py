@@ -3,9 +3,14 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
+import secrets
+import time
 import jwt
 import bcrypt
 import sqlite3
+from rate_limit import rate_limit
+import profile_cache
 
 router = APIRouter()
 
@@ -13,6 +18,12 @@ router = APIRouter()
 SECRET_KEY = "your-secret-key-here"  # Change this to a secure secret key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 30
+REFRESH_TOKEN_PURGE_INTERVAL = 60
+# Admin ids share a range with user and provider ids, so admin tokens carry their
+# own audience and are only accepted by get_current_admin
+ADMIN_AUDIENCE = "admin"
+PRINCIPAL_TYPES = ("user", "provider")
 
 # Pydantic models for request/response
 class UserRegister(BaseModel):
@@ -35,15 +46,70 @@ class LoginResponse(BaseModel):
     token_type: str
     user_id: int
     user_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 # JWT token creation
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    if to_encode.get("type") == "admin":
+        to_encode["aud"] = ADMIN_AUDIENCE
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Refresh tokens are random, so a single SHA-256 is enough to store them safely
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+_next_refresh_purge = 0.0
+
+def _purge_refresh_tokens(cursor: sqlite3.Cursor):
+    # Expired rows, and whole families that were logged out or revoked on reuse. Rotated
+    # rows of live families stay until they expire: replaying one is how reuse is caught
+    global _next_refresh_purge
+    now = time.time()
+    if now < _next_refresh_purge:
+        return
+    _next_refresh_purge = now + REFRESH_TOKEN_PURGE_INTERVAL
+
+    cutoff = datetime.utcnow().isoformat()
+    cursor.execute('''
+        DELETE FROM refresh_tokens
+        WHERE expires_at < ?
+           OR family_id NOT IN (
+               SELECT family_id FROM refresh_tokens
+               WHERE revoked_at IS NULL AND expires_at >= ?
+           )
+    ''', (cutoff, cutoff))
+
+def create_refresh_token(user_id: int, user_type: str, cursor: Optional[sqlite3.Cursor] = None,
+                         family_id: Optional[str] = None) -> str:
+    """Store a new refresh token; with a cursor it joins the caller's transaction."""
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    conn = None
+    if cursor is None:
+        conn = sqlite3.connect('services.db')
+        cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            INSERT INTO refresh_tokens (token_hash, family_id, user_id, user_type, expires_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (hash_refresh_token(token), family_id or secrets.token_hex(16),
+              user_id, user_type, expires_at.isoformat()))
+        # After the insert, so a family being rotated still has a live token
+        _purge_refresh_tokens(cursor)
+        if conn:
+            conn.commit()
+    finally:
+        if conn:
+            conn.close()
+    return token
+
 # Password hashing
 def hash_password(password: str) -> str:
     salt = bcrypt.gensalt()
@@ -76,8 +142,19 @@ async def register_user(user: UserRegister):
         ''', (user.email, hashed_password, user.name, user.phone, user.profile_image))
         
         user_id = c.lastrowid
+        refresh_token = create_refresh_token(user_id, "user", c)
         conn.commit()
         
+        # Write-through, so the /api/me call that follows registration is a hit
+        profile_cache.put("user", user_id, {
+            "id": user_id,
+            "email": user.email,
+            "name": user.name,
+            "phone": user.phone,
+            "profile_image": user.profile_image,
+            "type": "user"
+        })
+        
         # Create access token
         access_token = create_access_token(
             data={"sub": str(user_id), "type": "user"}
@@ -87,7 +164,8 @@ async def register_user(user: UserRegister):
             access_token=access_token,
             token_type="bearer",
             user_id=user_id,
-            user_type="user"
+            user_type="user",
+            refresh_token=refresh_token
         )
     except Exception as e:
         conn.rollback()
@@ -123,8 +201,22 @@ async def register_provider(provider: ProviderRegister):
               provider.phone, provider.profile_image, False, 0))
         
         provider_id = c.lastrowid
+        refresh_token = create_refresh_token(provider_id, "provider", c)
         conn.commit()
         
+        # Write-through, so the /api/me call that follows registration is a hit
+        profile_cache.put("provider", provider_id, {
+            "id": provider_id,
+            "email": provider.email,
+            "name": provider.name,
+            "phone": provider.phone,
+            "profile_image": provider.profile_image,
+            "is_verified": False,
+            "rating": 0,
+            "points": 0,
+            "type": "provider"
+        })
+        
         # Create access token
         access_token = create_access_token(
             data={"sub": str(provider_id), "type": "provider"}
@@ -134,7 +226,8 @@ async def register_provider(provider: ProviderRegister):
             access_token=access_token,
             token_type="bearer",
             user_id=provider_id,
-            user_type="provider"
+            user_type="provider",
+            refresh_token=refresh_token
         )
     except Exception as e:
         conn.rollback()
@@ -145,7 +238,7 @@ async def register_provider(provider: ProviderRegister):
     finally:
         conn.close()
 
-@router.post("/api/auth/user/login")
+@router.post("/api/auth/user/login", dependencies=[Depends(rate_limit("auth"))])
 async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
@@ -169,10 +262,11 @@ async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
         access_token=access_token,
         token_type="bearer",
         user_id=user[0],
-        user_type="user"
+        user_type="user",
+        refresh_token=create_refresh_token(user[0], "user")
     )
 
-@router.post("/api/auth/provider/login")
+@router.post("/api/auth/provider/login", dependencies=[Depends(rate_limit("auth"))])
 async def login_provider(form_data: OAuth2PasswordRequestForm = Depends()):
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
@@ -196,30 +290,152 @@ async def login_provider(form_data: OAuth2PasswordRequestForm = Depends()):
         access_token=access_token,
         token_type="bearer",
         user_id=provider[0],
-        user_type="provider"
+        user_type="provider",
+        refresh_token=create_refresh_token(provider[0], "provider")
+    )
+
+@router.post("/api/auth/admin/login", dependencies=[Depends(rate_limit("auth"))])
+async def login_admin(form_data: OAuth2PasswordRequestForm = Depends()):
+    conn = sqlite3.connect('services.db')
+    c = conn.cursor()
+    
+    c.execute('SELECT id, password FROM admins WHERE username = ?', (form_data.username,))
+    admin = c.fetchone()
+    conn.close()
+    
+    if not admin or not verify_password(form_data.password, admin[1]):
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    access_token = create_access_token(
+        data={"sub": str(admin[0]), "type": "admin"}
+    )
+    
+    return LoginResponse(
+        access_token=access_token,
+        token_type="bearer",
+        user_id=admin[0],
+        user_type="admin",
+        refresh_token=create_refresh_token(admin[0], "admin")
+    )
+
+@router.post("/api/auth/refresh")
+async def refresh_session(request: RefreshRequest):
+    # Renews a session without a password, so no bcrypt on this path
+    token_hash = hash_refresh_token(request.refresh_token)
+    conn = sqlite3.connect('services.db')
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('''
+            SELECT id, family_id, user_id, user_type, expires_at, revoked_at
+            FROM refresh_tokens WHERE token_hash = ?
+        ''', (token_hash,))
+        token = c.fetchone()
+
+        if token and token[5] is not None:
+            # A rotated token came back: it leaked, so end the whole session
+            c.execute('''
+                UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+                WHERE family_id = ? AND revoked_at IS NULL
+            ''', (token[1],))
+            conn.commit()
+            token = None
+
+        if not token or token[4] < datetime.utcnow().isoformat():
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid refresh token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        token_id, family_id, user_id, user_type = token[:4]
+        c.execute('''
+            UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP WHERE id = ?
+        ''', (token_id,))
+        refresh_token = create_refresh_token(user_id, user_type, c, family_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    access_token = create_access_token(
+        data={"sub": str(user_id), "type": user_type}
     )
 
+    return LoginResponse(
+        access_token=access_token,
+        token_type="bearer",
+        user_id=user_id,
+        user_type=user_type,
+        refresh_token=refresh_token
+    )
+
+@router.post("/api/auth/logout")
+async def logout(request: RefreshRequest):
+    conn = sqlite3.connect('services.db')
+    try:
+        c = conn.cursor()
+        c.execute('''
+            UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+            WHERE family_id = (SELECT family_id FROM refresh_tokens WHERE token_hash = ?)
+              AND revoked_at IS NULL
+        ''', (hash_refresh_token(request.refresh_token),))
+        conn.commit()
+        return {"message": "Logged out"}
+    finally:
+        conn.close()
+
 # Authentication middleware
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def decode_access_token(token: str, audience: Optional[str] = None) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Without an audience, tokens that carry one (admin tokens) are rejected
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], audience=audience)
         user_id: str = payload.get("sub")
         user_type: str = payload.get("type")
         if user_id is None or user_type is None:
             raise credentials_exception
         return {"user_id": int(user_id), "user_type": user_type}
-    except jwt.JWTError:
+    except jwt.PyJWTError:
         raise credentials_exception
 
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    current_user = decode_access_token(token)
+    if current_user["user_type"] not in PRINCIPAL_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return current_user
+
+async def get_current_admin(token: str = Depends(oauth2_scheme)):
+    current_user = decode_access_token(token, audience=ADMIN_AUDIENCE)
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
 @router.get("/api/me")
 async def read_users_me(current_user: dict = Depends(get_current_user)):
+    profile = profile_cache.get(current_user["user_type"], current_user["user_id"])
+    if profile is None:
+        profile = load_profile(current_user)
+        profile_cache.put(current_user["user_type"], current_user["user_id"], profile)
+    return profile
+
+def load_profile(current_user: dict) -> dict:
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
     
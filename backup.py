@@ -0,0 +1,159 @@
+from datetime import datetime
+from typing import Optional
+import asyncio
+import sqlite3
+import json
+import gzip
+import time
+import os
+
+BACKUP_DIR = "backups"
+# Compression reads the copy in chunks and pauses between them, so a backup
+# doesn't hog the disk and a CPU while the API is serving
+COMPRESS_CHUNK = 1024 * 1024
+CHUNK_PAUSE = 0.005
+# Progress is written to backup_runs at most this often
+SAVE_INTERVAL = 1.0
+# A running backup not updated for this long belongs to a worker that died
+STALE_AFTER = 600
+RUNNING = ("queued", "copying", "compressing")
+
+# Keeps started backups referenced until they finish, so they aren't garbage collected
+_tasks = set()
+
+def _claim() -> Optional[int]:
+    """Record a queued backup and return its id; None if another worker runs one."""
+    conn = sqlite3.connect('services.db')
+    try:
+        cursor = conn.cursor()
+        # Serializes workers asking for a backup at the same time
+        cursor.execute('BEGIN IMMEDIATE')
+        now = time.time()
+        cursor.execute('''
+            SELECT 1 FROM backup_runs
+            WHERE status IN (?, ?, ?) AND updated_at > ?
+        ''', (*RUNNING, now - STALE_AFTER))
+        if cursor.fetchone():
+            conn.rollback()
+            return None
+
+        cursor.execute('''
+            UPDATE backup_runs SET status = 'failed' WHERE status IN (?, ?, ?)
+        ''', RUNNING)
+        cursor.execute('''
+            INSERT INTO backup_runs (status, progress, updated_at) VALUES ('queued', ?, ?)
+        ''', (json.dumps({"status": "queued"}), now))
+        conn.commit()
+        return cursor.lastrowid
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+class _Progress:
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self.state = {}
+        self.saved_at = 0.0
+
+    def update(self, force: bool = False, **fields):
+        self.state.update(fields)
+        if not force and time.monotonic() - self.saved_at < SAVE_INTERVAL:
+            return
+        conn = sqlite3.connect('services.db')
+        try:
+            conn.execute('''
+                UPDATE backup_runs SET status = ?, progress = ?, updated_at = ? WHERE id = ?
+            ''', (self.state["status"], json.dumps(self.state), time.time(), self.run_id))
+            conn.commit()
+        finally:
+            conn.close()
+        self.saved_at = time.monotonic()
+
+def progress() -> dict:
+    """Progress of the latest backup, whichever worker runs it."""
+    conn = sqlite3.connect('services.db')
+    try:
+        row = conn.execute('SELECT progress FROM backup_runs ORDER BY id DESC LIMIT 1').fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else {"status": "idle"}
+
+def _compress(raw_path: str, gz_path: str, state: _Progress):
+    state.update(force=True, status="compressing", bytes_total=os.path.getsize(raw_path), bytes_done=0)
+    with open(raw_path, "rb") as raw, gzip.open(gz_path, "wb", compresslevel=6) as gz:
+        for chunk in iter(lambda: raw.read(COMPRESS_CHUNK), b""):
+            gz.write(chunk)
+            state.update(bytes_done=state.state["bytes_done"] + len(chunk))
+            time.sleep(CHUNK_PAUSE)
+
+def create_backup(backup_dir: str = BACKUP_DIR, run_id: Optional[int] = None) -> dict:
+    """Copy services.db with the online backup API and gzip it; safe while the API runs."""
+    if run_id is None:
+        run_id = _claim()
+        if run_id is None:
+            raise RuntimeError("A backup is already running")
+
+    os.makedirs(backup_dir, exist_ok=True)
+    # The run id keeps names unique even for backups started within the same second
+    name = f"services-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{run_id}.db"
+    raw_path = os.path.join(backup_dir, f"{name}.partial")
+    gz_path = os.path.join(backup_dir, f"{name}.gz")
+
+    started = time.monotonic()
+    state = _Progress(run_id)
+    state.update(force=True, status="copying", pages_done=0, pages_total=None,
+                 started_at=datetime.utcnow().isoformat())
+
+    src = sqlite3.connect('services.db')
+    dst = sqlite3.connect(raw_path)
+    try:
+        # One step: under WAL it only holds a read snapshot, so writers carry on. A
+        # stepped copy restarts from page 0 whenever another connection writes
+        src.backup(dst, pages=-1, progress=lambda status, remaining, total: state.update(
+            pages_total=total, pages_done=total - remaining
+        ))
+        dst.close()
+
+        _compress(raw_path, f"{gz_path}.partial", state)
+        os.replace(f"{gz_path}.partial", gz_path)
+
+        state.update(
+            force=True,
+            status="done",
+            path=gz_path,
+            size=os.path.getsize(gz_path),
+            duration_seconds=round(time.monotonic() - started, 3)
+        )
+        return dict(state.state)
+    except Exception as e:
+        state.update(force=True, status="failed", error=str(e))
+        raise
+    finally:
+        src.close()
+        dst.close()
+        for leftover in (raw_path, f"{gz_path}.partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+def _finished(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Backup failed: {task.exception()}")
+
+def start_backup() -> bool:
+    """Start a backup in the background; False if one is already running on any worker."""
+    run_id = _claim()
+    if run_id is None:
+        return False
+    # Runs in a worker thread, so the event loop keeps serving
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(create_backup, BACKUP_DIR, run_id))
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+    return True
+
+if __name__ == "__main__":
+    result = create_backup()
+    print(f"Wrote {result['path']} ({result['size']} bytes, "
+          f"{result['pages_total']} pages) in {result['duration_seconds']}s")
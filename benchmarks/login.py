@@ -0,0 +1,73 @@
+"""Cost of renewing a session with a password login vs a refresh token.
+
+Run from the repository root:
+
+    python benchmarks/login.py --rounds 50
+
+Calls the real endpoint handlers against a scratch copy of services.db, so the
+refresh path includes its BEGIN IMMEDIATE, the token lookup and both writes
+(revoking the old token and storing the new one) with their commit.
+"""
+import argparse
+import asyncio
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.security import OAuth2PasswordRequestForm
+from auth import UserRegister, RefreshRequest, register_user, login_user, refresh_session
+import migrate
+
+def per_call(run, rounds: int):
+    """(wall seconds, CPU seconds) per call."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(rounds):
+        run()
+    return (time.perf_counter() - wall) / rounds, (time.process_time() - cpu) / rounds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    shutil.copy(os.path.join(ROOT, "services.db"), workdir)
+    # The handlers open 'services.db' relative to the working directory
+    os.chdir(workdir)
+    loop = asyncio.new_event_loop()
+    try:
+        migrate.migrate()
+        email, password = f"bench-{os.getpid()}@example.com", "correct horse battery staple"
+        session = loop.run_until_complete(register_user(
+            UserRegister(email=email, password=password, name="Bench", phone="0")
+        ))
+        form = OAuth2PasswordRequestForm(username=email, password=password)
+
+        def password_login():
+            loop.run_until_complete(login_user(form))
+
+        def refresh_login():
+            # Each refresh rotates the token, so chain them like a client would
+            response = loop.run_until_complete(
+                refresh_session(RefreshRequest(refresh_token=session.refresh_token))
+            )
+            session.refresh_token = response.refresh_token
+
+        login_wall, login_cpu = per_call(password_login, args.rounds)
+        refresh_wall, refresh_cpu = per_call(refresh_login, args.rounds * 10)
+    finally:
+        loop.close()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir)
+
+    print(f"password login  {login_wall * 1000:8.3f} ms  ({login_cpu * 1000:8.3f} ms CPU)")
+    print(f"refresh         {refresh_wall * 1000:8.3f} ms  ({refresh_cpu * 1000:8.3f} ms CPU)")
+    print(f"reduction       {login_wall / refresh_wall:8.0f}x  ({login_cpu / refresh_cpu:8.0f}x CPU)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Time from process start until the API reports ready and serves its first request.
+
+Run from the repository root:
+
+    python benchmarks/startup.py --runs 5
+"""
+import http.client
+import subprocess
+import argparse
+import json
+import time
+import sys
+
+HOST = "127.0.0.1"
+PORT = 8000
+
+def get(path: str):
+    conn = http.client.HTTPConnection(HOST, PORT, timeout=2)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+def measure() -> dict:
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        first_response = None
+        while True:
+            try:
+                status, body = get("/health")
+            except OSError:
+                time.sleep(0.01)
+                continue
+            if first_response is None:
+                first_response = time.monotonic() - started
+            if status == 200:
+                break
+            time.sleep(0.01)
+
+        ready = time.monotonic() - started
+        request_started = time.monotonic()
+        get("/api/featured-services")
+        return {
+            "listening": first_response,
+            "ready": ready,
+            "first_request": time.monotonic() - request_started,
+            "reported": json.loads(body).get("ready_after_seconds")
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for run in range(args.runs):
+        result = measure()
+        print(f"run {run + 1}: listening {result['listening'] * 1000:7.1f} ms  "
+              f"ready {result['ready'] * 1000:7.1f} ms  "
+              f"first request {result['first_request'] * 1000:6.2f} ms  "
+              f"(worker reported {result['reported']}s)")
+
+if __name__ == "__main__":
+    main()
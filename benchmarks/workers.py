@@ -0,0 +1,79 @@
+"""Throughput of the API as the number of uvicorn workers grows.
+
+Run from the repository root:
+
+    python benchmarks/workers.py --workers 1 2 4 --seconds 10
+
+Each round starts `python main.py` with WEB_CONCURRENCY set, hammers
+/api/categories from several client processes over keep-alive connections
+and prints requests per second.
+"""
+from multiprocessing import Pool
+import http.client
+import subprocess
+import argparse
+import socket
+import time
+import sys
+import os
+
+HOST = "127.0.0.1"
+PORT = 8000
+
+def wait_for_port(timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((HOST, PORT), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+def client(args):
+    path, seconds = args
+    conn = http.client.HTTPConnection(HOST, PORT)
+    count = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+        conn.getresponse().read()
+        count += 1
+    conn.close()
+    return count
+
+def run_round(workers: int, clients: int, seconds: float, path: str) -> float:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers))
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port()
+        # Warm every worker before measuring
+        with Pool(clients) as pool:
+            pool.map(client, [(path, 1)] * clients)
+            total = sum(pool.map(client, [(path, seconds)] * clients))
+        return total / seconds
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--path", default="/api/categories")
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        rps = run_round(workers, args.clients, args.seconds, args.path)
+        baseline = baseline or rps
+        print(f"workers={workers:<3} {rps:10.1f} req/s  x{rps / baseline:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
+from datetime import datetime
+import sqlite3
+from auth import get_current_user
+from init_db import BookingStatus
+import analytics
+import tasks
+import profile_cache
+
+router = APIRouter(prefix="/api")
+
+POINTS_PER_COMPLETED_BOOKING = 10
+UPCOMING_LIMIT = 5
+OPEN_STATUSES = (BookingStatus.PENDING.value, BookingStatus.ONGOING.value)
+
+# Status -> statuses a booking may move to; completed and canceled are final
+ALLOWED_TRANSITIONS = {
+    BookingStatus.PENDING.value: {BookingStatus.ONGOING.value, BookingStatus.CANCELED.value},
+    BookingStatus.ONGOING.value: {BookingStatus.COMPLETED.value, BookingStatus.CANCELED.value},
+    BookingStatus.COMPLETED.value: set(),
+    BookingStatus.CANCELED.value: set()
+}
+
+class BookingStatusUpdate(BaseModel):
+    status: str
+
+@router.get("/bookings/summary")
+async def get_booking_summary(current_user: dict = Depends(get_current_user)):
+    if current_user["user_type"] != "provider":
+        raise HTTPException(status_code=403, detail="Only providers have a booking summary")
+
+    provider_id = current_user["user_id"]
+    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    conn = sqlite3.connect('services.db')
+    try:
+        c = conn.cursor()
+        # Every query here is answered from idx_bookings_provider_status_schedule alone
+        c.execute('''
+            SELECT status, payment_status, COUNT(*)
+            FROM bookings
+            WHERE provider_id = ?
+            GROUP BY status, payment_status
+        ''', (provider_id,))
+        by_status, by_payment_status = {}, {}
+        for booking_status, payment_status, count in c.fetchall():
+            by_status[booking_status] = by_status.get(booking_status, 0) + count
+            by_payment_status[payment_status] = by_payment_status.get(payment_status, 0) + count
+
+        open_filter = f'''
+            WHERE provider_id = ? AND status IN ({",".join("?" * len(OPEN_STATUSES))})
+              AND schedule_date >= ?
+        '''
+        params = (provider_id, *OPEN_STATUSES, now)
+        c.execute(f'SELECT COUNT(*) FROM bookings {open_filter}', params)
+        upcoming_count = c.fetchone()[0]
+
+        c.execute(f'''
+            SELECT id, status, schedule_date FROM bookings
+            {open_filter}
+            ORDER BY schedule_date
+            LIMIT ?
+        ''', params + (UPCOMING_LIMIT,))
+        upcoming = c.fetchall()
+    finally:
+        conn.close()
+
+    return {
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "by_payment_status": by_payment_status,
+        "upcoming_count": upcoming_count,
+        "upcoming": [
+            {"id": b[0], "status": b[1], "schedule_date": b[2]}
+            for b in upcoming
+        ]
+    }
+
+@router.put("/bookings/{booking_id}/status")
+async def update_booking_status(
+    booking_id: int,
+    update: BookingStatusUpdate,
+    current_user: dict = Depends(get_current_user)
+):
+    if update.status not in {s.value for s in BookingStatus}:
+        raise HTTPException(status_code=400, detail="Invalid booking status")
+
+    # Users may only cancel their own bookings, providers drive the rest
+    if current_user["user_type"] == "user":
+        if update.status != BookingStatus.CANCELED.value:
+            raise HTTPException(status_code=403, detail="Users can only cancel bookings")
+        owner_column = "user_id"
+    elif current_user["user_type"] == "provider":
+        owner_column = "provider_id"
+    else:
+        raise HTTPException(status_code=403, detail="Not authorized to update this booking")
+
+    conn = sqlite3.connect('services.db')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+
+        cursor.execute(f'''
+            SELECT status, user_id, provider_id FROM bookings
+            WHERE id = ? AND {owner_column} = ?
+        ''', (booking_id, current_user["user_id"]))
+        booking = cursor.fetchone()
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
+
+        old_status = booking[0]
+        if old_status != update.status:
+            if update.status not in ALLOWED_TRANSITIONS.get(old_status, set()):
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Cannot change a {old_status} booking to {update.status}"
+                )
+            cursor.execute('''
+                UPDATE bookings SET status = ? WHERE id = ?
+            ''', (update.status, booking_id))
+            analytics.apply_booking_status_change(cursor, booking_id, old_status, update.status)
+            # Notifications, points and the chat message are written by the task queue
+            tasks.enqueue(cursor, "booking_status_changed", {
+                "booking_id": booking_id,
+                "user_id": booking[1],
+                "provider_id": booking[2],
+                "old_status": old_status,
+                "status": update.status
+            })
+
+        conn.commit()
+        return {"id": booking_id, "status": update.status}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+@tasks.task_handler("booking_status_changed")
+def fan_out_booking_status(conn: sqlite3.Connection, changes: list):
+    cursor = conn.cursor()
+
+    notifications = []
+    for change in changes:
+        message = f"Booking #{change['booking_id']} is now {change['status']}"
+        notifications.append((change["user_id"], None, change["booking_id"], message))
+        notifications.append((None, change["provider_id"], change["booking_id"], message))
+    cursor.executemany('''
+        INSERT INTO notifications (user_id, provider_id, booking_id, message)
+        VALUES (?, ?, ?, ?)
+    ''', notifications)
+
+    cursor.executemany('''
+        INSERT INTO chats (booking_id, sender_id, sender_type, message)
+        VALUES (?, 0, 'system', ?)
+    ''', [
+        (change["booking_id"], f"Booking status changed to {change['status']}")
+        for change in changes
+    ])
+
+    # The flag makes points a one-off per booking, even if a batch runs twice
+    completed = []
+    for change in changes:
+        if change["status"] != BookingStatus.COMPLETED.value:
+            continue
+        cursor.execute('''
+            UPDATE bookings SET points_awarded = 1 WHERE id = ? AND points_awarded = 0
+        ''', (change["booking_id"],))
+        if cursor.rowcount:
+            completed.append((POINTS_PER_COMPLETED_BOOKING, change["provider_id"]))
+    if completed:
+        cursor.executemany('''
+            UPDATE service_providers SET points = points + ? WHERE id = ?
+        ''', completed)
+        # Points are part of the provider's /api/me profile
+        for provider_id in {provider_id for _, provider_id in completed}:
+            profile_cache.invalidate("provider", provider_id, conn)
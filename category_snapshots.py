@@ -0,0 +1,62 @@
+from typing import List
+import threading
+import sqlite3
+import coherence
+from listings import LISTING_COLUMNS, fetch_category_listings
+
+NAMESPACE_PREFIX = "category:"
+
+# category path -> full listing, and per-category version counters; a snapshot is
+# only stored if its category's version didn't move while it was being built
+_snapshots = {}
+_versions = {}
+_lock = threading.Lock()
+
+def _invalidate(namespace: str):
+    path = namespace[len(NAMESPACE_PREFIX):]
+    with _lock:
+        _versions[path] = _versions.get(path, 0) + 1
+        _snapshots.pop(path, None)
+
+coherence.register_prefix(NAMESPACE_PREFIX, _invalidate)
+
+def get_listing(category_path: str) -> List[dict]:
+    """Full-field listing of a category, built once per category version."""
+    snapshot = _snapshots.get(category_path)
+    if snapshot is not None:
+        return snapshot
+
+    version = _versions.get(category_path, 0)
+    conn = sqlite3.connect('services.db')
+    try:
+        exists = conn.execute('SELECT 1 FROM categories WHERE path = ?', (category_path,)).fetchone()
+        listing = fetch_category_listings(conn, category_path, list(LISTING_COLUMNS))
+    finally:
+        conn.close()
+
+    # Unknown paths aren't cached, or arbitrary URLs could fill memory
+    if exists:
+        with _lock:
+            if _versions.get(category_path, 0) == version:
+                _snapshots[category_path] = listing
+    return listing
+
+def publish_categories(conn: sqlite3.Connection, category_paths):
+    for path in set(category_paths):
+        coherence.publish(f"{NAMESPACE_PREFIX}{path}", conn)
+
+def publish_service(conn: sqlite3.Connection, service_id: int):
+    """Refresh the snapshot of the category a service belongs to."""
+    rows = conn.execute('''
+        SELECT c.path FROM services s JOIN categories c ON s.category_id = c.id
+        WHERE s.id = ?
+    ''', (service_id,)).fetchall()
+    publish_categories(conn, [row[0] for row in rows])
+
+def publish_provider(conn: sqlite3.Connection, provider_id: int):
+    """Refresh every category where the provider's name, image or rating is shown."""
+    rows = conn.execute('''
+        SELECT DISTINCT c.path FROM services s JOIN categories c ON s.category_id = c.id
+        WHERE s.provider_id = ?
+    ''', (provider_id,)).fetchall()
+    publish_categories(conn, [row[0] for row in rows])
@@ -0,0 +1,83 @@
+from init_db import BookingStatus
+from typing import List
+import sqlite3
+import json
+import zlib
+import sys
+
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH = 100
+
+ARCHIVABLE_STATUSES = (BookingStatus.COMPLETED.value, BookingStatus.CANCELED.value)
+
+def load_archived_messages(cursor: sqlite3.Cursor, booking_id: int) -> List[tuple]:
+    """Cold messages of a booking, shaped like `SELECT * FROM chats` rows."""
+    cursor.execute('SELECT payload FROM chat_archives WHERE booking_id = ?', (booking_id,))
+    row = cursor.fetchone()
+    if not row:
+        return []
+    return [
+        (message[0], booking_id, *message[1:])
+        for message in json.loads(zlib.decompress(row[0]))
+    ]
+
+def _archive_booking(conn: sqlite3.Connection, booking_id: int) -> int:
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            SELECT id, sender_id, sender_type, message, created_at FROM chats
+            WHERE booking_id = ?
+            ORDER BY created_at, id
+        ''', (booking_id,))
+        hot = [list(row) for row in cursor.fetchall()]
+        if not hot:
+            conn.commit()
+            return 0
+
+        # A thread can be archived again if messages arrived after the first pass
+        cold = [[m[0], *m[2:]] for m in load_archived_messages(cursor, booking_id)]
+        messages = cold + hot
+        payload = zlib.compress(json.dumps(messages, separators=(",", ":")).encode("utf-8"), 9)
+
+        cursor.execute('''
+            INSERT OR REPLACE INTO chat_archives
+            (booking_id, message_count, last_created_at, payload, archived_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (booking_id, len(messages), messages[-1][4], payload))
+        cursor.execute('DELETE FROM chats WHERE booking_id = ?', (booking_id,))
+        conn.commit()
+        return len(hot)
+    except Exception:
+        conn.rollback()
+        raise
+
+def archive_chats(conn: sqlite3.Connection, older_than_days: int = ARCHIVE_AFTER_DAYS) -> dict:
+    """Move threads of finished bookings that went quiet into chat_archives."""
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT ch.booking_id
+        FROM chats ch
+        JOIN bookings b ON ch.booking_id = b.id
+        WHERE b.status IN ({",".join("?" * len(ARCHIVABLE_STATUSES))})
+        GROUP BY ch.booking_id
+        HAVING MAX(ch.created_at) < datetime('now', ?)
+        LIMIT ?
+    ''', (*ARCHIVABLE_STATUSES, f"-{older_than_days} days", ARCHIVE_BATCH))
+    booking_ids = [row[0] for row in cursor.fetchall()]
+
+    moved = 0
+    # One short transaction per booking keeps the write lock free for requests
+    for booking_id in booking_ids:
+        moved += _archive_booking(conn, booking_id)
+
+    return {"bookings": len(booking_ids), "messages": moved}
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_DAYS
+    conn = sqlite3.connect('services.db')
+    try:
+        result = archive_chats(conn, days)
+        print(f"Archived {result['messages']} messages from {result['bookings']} bookings")
+    finally:
+        conn.close()
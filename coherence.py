@@ -0,0 +1,76 @@
+from collections import defaultdict
+from typing import Callable, Optional
+import sqlite3
+import asyncio
+
+# How often each worker checks whether another process has written to the database
+POLL_INTERVAL = 0.02
+
+_callbacks = defaultdict(list)
+_prefix_callbacks = []
+_seen_versions = {}
+
+def register(namespace: str, callback: Callable[[], None]):
+    """Run `callback` whenever `namespace` is published by any worker."""
+    _callbacks[namespace].append(callback)
+
+def register_prefix(prefix: str, callback: Callable[[str], None]):
+    """Run `callback(namespace)` for every published namespace starting with `prefix`."""
+    _prefix_callbacks.append((prefix, callback))
+
+def _invalidate(namespace: str):
+    for callback in _callbacks.get(namespace, []):
+        callback()
+    for prefix, callback in _prefix_callbacks:
+        if namespace.startswith(prefix):
+            callback(namespace)
+
+def publish(namespace: str, conn: Optional[sqlite3.Connection] = None):
+    """Bump `namespace` so caches in every worker drop it.
+
+    Pass the writer's connection to bump inside its transaction; the bump then
+    becomes visible to other workers exactly when the write commits.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('services.db')
+    try:
+        conn.execute('''
+            INSERT INTO cache_versions (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+        ''', (namespace,))
+        if own_conn:
+            conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+
+    # This worker doesn't have to wait for the poller
+    _invalidate(namespace)
+
+def _check(conn: sqlite3.Connection, last_data_version):
+    # data_version only changes when another connection commits, so this is
+    # one cheap pragma per tick while nothing is being written
+    data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+    if data_version == last_data_version:
+        return data_version
+
+    for name, version in conn.execute('SELECT name, version FROM cache_versions'):
+        if _seen_versions.get(name) != version:
+            if name in _seen_versions or last_data_version is not None:
+                _invalidate(name)
+            _seen_versions[name] = version
+    return data_version
+
+async def poll_forever(interval: float = POLL_INTERVAL):
+    conn = sqlite3.connect('services.db')
+    last_data_version = None
+    try:
+        while True:
+            try:
+                last_data_version = _check(conn, last_data_version)
+            except sqlite3.Error as e:
+                print(f"Cache coherence poll failed: {e}")
+            await asyncio.sleep(interval)
+    finally:
+        conn.close()
@@ -0,0 +1,155 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from datetime import date, timedelta
+from typing import Optional
+import sqlite3
+import heapq
+import json
+import csv
+import io
+from auth import get_current_user
+from chat_archive import load_archived_messages
+
+router = APIRouter(prefix="/api/export")
+
+CHUNK_ROWS = 500
+
+BOOKING_COLUMNS = [
+    "id", "user_id", "service_id", "service_name", "provider_id", "booking_type",
+    "schedule_date", "status", "payment_status", "created_at"
+]
+
+CHAT_COLUMNS = ["id", "booking_id", "sender_id", "sender_type", "message", "created_at"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _owner_column(current_user: dict) -> str:
+    return "b.user_id" if current_user["user_type"] == "user" else "b.provider_id"
+
+def _date_filter(column: str, start: Optional[date], end: Optional[date]):
+    # `end` is inclusive, so compare against the start of the following day
+    clauses, params = [], []
+    if start:
+        clauses.append(f"{column} >= ?")
+        params.append(start.isoformat())
+    if end:
+        clauses.append(f"{column} < ?")
+        params.append((end + timedelta(days=1)).isoformat())
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+def _encode(chunks, columns: list, fmt: str):
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for rows in chunks:
+            yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+
+def _stream_rows(sql: str, params: list, columns: list, fmt: str):
+    # StreamingResponse may advance this generator from different threadpool threads
+    conn = sqlite3.connect('services.db', check_same_thread=False)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        yield from _encode(iter(lambda: cursor.fetchmany(CHUNK_ROWS), []), columns, fmt)
+    finally:
+        conn.close()
+
+def _stream_chats(owner_column: str, owner_id: int, start: Optional[date],
+                  end: Optional[date], fmt: str):
+    """Hot and archived messages, one booking at a time, each in created_at order."""
+    date_sql, date_params = _date_filter("created_at", start, end)
+    low = start.isoformat() if start else None
+    high = (end + timedelta(days=1)).isoformat() if end else None
+
+    conn = sqlite3.connect('services.db', check_same_thread=False)
+    try:
+        cursor = conn.cursor()
+        # One read transaction, so a thread being archived meanwhile is seen once
+        cursor.execute('BEGIN')
+        cursor.execute(f'''
+            SELECT b.id FROM bookings b
+            WHERE {owner_column} = ?
+              AND (EXISTS (SELECT 1 FROM chats ch WHERE ch.booking_id = b.id)
+                   OR EXISTS (SELECT 1 FROM chat_archives a WHERE a.booking_id = b.id))
+            ORDER BY b.id
+        ''', (owner_id,))
+        booking_ids = [row[0] for row in cursor.fetchall()]
+
+        def chunks():
+            for booking_id in booking_ids:
+                archived = [
+                    m for m in load_archived_messages(cursor, booking_id)
+                    if (low is None or m[5] >= low) and (high is None or m[5] < high)
+                ]
+                cursor.execute(f'''
+                    SELECT id, booking_id, sender_id, sender_type, message, created_at
+                    FROM chats
+                    WHERE booking_id = ?{date_sql}
+                    ORDER BY created_at
+                ''', [booking_id] + date_params)
+                rows = list(heapq.merge(archived, cursor.fetchall(), key=lambda m: m[5]))
+                if rows:
+                    yield rows
+
+        yield from _encode(chunks(), CHAT_COLUMNS, fmt)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _check_format(fmt: str):
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+def _export_response(body, fmt: str, name: str):
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    )
+
+@router.get("/bookings")
+async def export_bookings(
+    format: str = "ndjson",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    _check_format(format)
+    date_sql, date_params = _date_filter("b.created_at", start, end)
+    sql = f'''
+        SELECT b.id, b.user_id, b.service_id, s.name, b.provider_id, b.booking_type,
+               b.schedule_date, b.status, b.payment_status, b.created_at
+        FROM bookings b
+        JOIN services s ON b.service_id = s.id
+        WHERE {_owner_column(current_user)} = ?{date_sql}
+        ORDER BY b.created_at
+    '''
+    return _export_response(
+        _stream_rows(sql, [current_user["user_id"]] + date_params, BOOKING_COLUMNS, format),
+        format, "bookings"
+    )
+
+@router.get("/chats")
+async def export_chats(
+    format: str = "ndjson",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    _check_format(format)
+    # Old threads live in chat_archives, so chats are merged per booking
+    return _export_response(
+        _stream_chats(_owner_column(current_user), current_user["user_id"], start, end, format),
+        format, "chats"
+    )
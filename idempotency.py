@@ -0,0 +1,78 @@
+from fastapi import HTTPException
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import sqlite3
+import json
+import time
+
+KEY_TTL = 24 * 60 * 60
+PURGE_INTERVAL = 60
+MAX_MEMORY_ENTRIES = 10000
+MAX_KEY_LENGTH = 255
+
+# (principal, key) -> (fingerprint, response, stored_at); saves the table lookup for hot retries
+_recent = OrderedDict()
+_next_purge = 0.0
+
+def principal_of(current_user: dict) -> str:
+    return f"{current_user['user_type']}:{current_user['user_id']}"
+
+def fingerprint(route: str, body: dict) -> str:
+    return hashlib.sha256(f"{route}:{json.dumps(body, sort_keys=True)}".encode()).hexdigest()
+
+def _check_match(stored_fingerprint: str, request_fingerprint: str):
+    if stored_fingerprint != request_fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request"
+        )
+
+def recall(principal: str, key: str, request_fingerprint: str) -> Optional[dict]:
+    """Answer a replay from memory, before any database work."""
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+    entry = _recent.get((principal, key))
+    if entry and entry[2] > time.time() - KEY_TTL:
+        _check_match(entry[0], request_fingerprint)
+        return entry[1]
+    return None
+
+def lookup(cursor: sqlite3.Cursor, principal: str, key: str, request_fingerprint: str) -> Optional[dict]:
+    """Return the stored response for a replayed key, or None if the key is new.
+
+    Call inside the write transaction (after BEGIN IMMEDIATE) so concurrent
+    retries of the same key are serialized.
+    """
+    now = time.time()
+    cursor.execute('''
+        SELECT fingerprint, response FROM idempotency_keys
+        WHERE principal = ? AND key = ? AND created_at > ?
+    ''', (principal, key, now - KEY_TTL))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    _check_match(row[0], request_fingerprint)
+    return json.loads(row[1])
+
+def store(cursor: sqlite3.Cursor, principal: str, key: str, request_fingerprint: str, response: dict):
+    """Record the response in the same transaction as the write it describes."""
+    global _next_purge
+    now = time.time()
+    if now >= _next_purge:
+        cursor.execute('DELETE FROM idempotency_keys WHERE created_at <= ?', (now - KEY_TTL,))
+        _next_purge = now + PURGE_INTERVAL
+
+    cursor.execute('''
+        INSERT OR REPLACE INTO idempotency_keys (principal, key, fingerprint, response, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (principal, key, request_fingerprint, json.dumps(response), now))
+
+def remember(principal: str, key: str, request_fingerprint: str, response: dict):
+    """Keep a committed response in memory for fast replays."""
+    _recent[(principal, key)] = (request_fingerprint, response, time.time())
+    _recent.move_to_end((principal, key))
+    while len(_recent) > MAX_MEMORY_ENTRIES:
+        _recent.popitem(last=False)
@@ -0,0 +1,234 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from collections import OrderedDict
+from typing import Optional
+import asyncio
+import hashlib
+import struct
+import zlib
+import time
+import os
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it only originals are served
+    Image = None
+
+router = APIRouter(prefix="/api")
+
+IMAGES_DIR = "images"
+CACHE_DIR = "image_cache"
+MAX_DIMENSION = 2000
+# Requested sizes are rounded up to one of these, so a client can't make us render
+# (and store) every size from 1 to MAX_DIMENSION
+SIZE_BUCKETS = (16, 32, 48, 64, 96, 128, 200, 256, 320, 400, 512, 640, 800, 1024, 1280, 1600, MAX_DIMENSION)
+# Least recently used files are removed from CACHE_DIR beyond this
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# A cache hit refreshes the file's mtime (its LRU position) at most this often
+TOUCH_INTERVAL = 3600
+MAX_DIGESTS = 4096
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+MEDIA_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp"
+}
+
+# (path, mtime, size) -> sha256 of the file, so originals are hashed once
+_digests = OrderedDict()
+
+def _file_digest(path: str) -> str:
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _digests.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _digests[key] = digest
+        while len(_digests) > MAX_DIGESTS:
+            _digests.popitem(last=False)
+    else:
+        _digests.move_to_end(key)
+    return digest
+
+def _snap_dimension(value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return None
+    if not 1 <= value <= MAX_DIMENSION:
+        raise HTTPException(status_code=400, detail=f"Image dimensions must be between 1 and {MAX_DIMENSION}")
+    return next(size for size in SIZE_BUCKETS if size >= value)
+
+def _touch(path: str):
+    try:
+        if os.stat(path).st_mtime < time.time() - TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+def _evict_cache():
+    """Remove the least recently used files until CACHE_DIR fits in MAX_CACHE_BYTES."""
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        try:
+            stat = entry.stat()
+        except OSError:  # Removed by another worker meanwhile
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= MAX_CACHE_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+def _placeholder_png(width: int, height: int) -> bytes:
+    # Flat grey PNG, written by hand so placeholders don't need Pillow
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (struct.pack(">I", len(data)) + tag + data
+                + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+    row = b"\x00" + b"\xe5\xe7\xeb" * width
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(row * height, 9))
+            + chunk(b"IEND", b""))
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    _evict_cache()
+
+def _resized_path(source: str, width: Optional[int], height: Optional[int]) -> str:
+    ext = os.path.splitext(source)[1].lower()
+    name = hashlib.sha256(f"{_file_digest(source)}:{width}x{height}".encode()).hexdigest()[:32]
+    target = os.path.join(CACHE_DIR, f"{name}{ext}")
+    if os.path.exists(target):
+        _touch(target)
+        return target
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with Image.open(source) as img:
+        # A missing dimension keeps the aspect ratio
+        w = width or max(1, round(img.width * height / img.height))
+        h = height or max(1, round(img.height * width / img.width))
+        img.thumbnail((w, h))
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        img.save(tmp_path, format=img.format or Image.registered_extensions().get(ext), optimize=True)
+        os.replace(tmp_path, target)
+    _evict_cache()
+    return target
+
+def _parse_range(range_header: str, file_size: int):
+    units, _, spec = range_header.partition("=")
+    if units.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start:
+            first = int(start)
+            last = int(end) if end else file_size - 1
+        else:
+            first = file_size - int(end)
+            last = file_size - 1
+    except ValueError:
+        return None
+    first = max(first, 0)
+    last = min(last, file_size - 1)
+    if first > last:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return first, last
+
+def _iter_file(path: str, first: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(first)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+def serve_file(request: Request, path: str, etag: str) -> Response:
+    media_type = MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "ETag": f'"{etag}"',
+        "Accept-Ranges": "bytes"
+    }
+
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    file_size = os.path.getsize(path)
+    range_header = request.headers.get("range")
+    byte_range = _parse_range(range_header, file_size) if range_header else None
+    if byte_range:
+        first, last = byte_range
+        headers["Content-Range"] = f"bytes {first}-{last}/{file_size}"
+        headers["Content-Length"] = str(last - first + 1)
+        return StreamingResponse(
+            _iter_file(path, first, last - first + 1),
+            status_code=206,
+            media_type=media_type,
+            headers=headers
+        )
+
+    # FileResponse hands the file to the server (sendfile/pathsend where available)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@router.get("/placeholder/{width}/{height}")
+async def get_placeholder(width: int, height: int, request: Request):
+    width = _snap_dimension(width)
+    height = _snap_dimension(height)
+
+    path = os.path.join(CACHE_DIR, f"placeholder-{width}x{height}.png")
+    if os.path.exists(path):
+        _touch(path)
+    else:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Rendering, writing and evicting are blocking work; keep them off the event loop
+        await asyncio.to_thread(lambda: _write_atomic(path, _placeholder_png(width, height)))
+
+    return serve_file(request, path, _file_digest(path))
+
+@router.get("/images/{filename}")
+async def get_image(
+    filename: str,
+    request: Request,
+    w: Optional[int] = None,
+    h: Optional[int] = None
+):
+    w = _snap_dimension(w)
+    h = _snap_dimension(h)
+
+    source = os.path.join(IMAGES_DIR, os.path.basename(filename))
+    if os.path.splitext(source)[1].lower() not in MEDIA_TYPES or not os.path.isfile(source):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    if w is None and h is None:
+        return serve_file(request, source, _file_digest(source))
+
+    # Serving the original under a ?w= URL would be cached as that size for a year
+    if Image is None:
+        raise HTTPException(status_code=501, detail="Image resizing is not available on this server")
+
+    # Decoding, resizing and encoding (and hashing a new source) block, so run in a thread
+    path = await asyncio.to_thread(_resized_path, source, w, h)
+    return serve_file(request, path, _file_digest(path))
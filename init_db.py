@@ -1,4 +1,6 @@
 import sqlite3
+import bcrypt
+import migrate
 from datetime import datetime
 from enum import Enum
 
@@ -32,7 +34,9 @@ def init_db():
         tables = [
             'chats', 'reviews', 'notifications', 'rankings', 'reports', 
             'bookings', 'services', 'addresses', 'service_providers', 
-            'users', 'admins', 'categories'
+            'users', 'admins', 'categories', 'cache_versions',
+            'booking_rollups', 'tasks', 'idempotency_keys', 'chat_archives',
+            'refresh_tokens'
         ]
         for table in tables:
             cursor.execute(f'DROP TABLE IF EXISTS {table}')
@@ -258,7 +262,7 @@ def init_db():
         cursor.execute('''
             INSERT INTO admins (username, password)
             VALUES (?, ?)
-        ''', ('admin', 'admin_password'))
+        ''', ('admin', bcrypt.hashpw(b'admin_password', bcrypt.gensalt()).decode('utf-8')))
         print("Inserted sample admin")
 
         # Insert sample services
@@ -298,6 +302,11 @@ def init_db():
         conn.commit()
         print("\nAll changes committed successfully!")
 
+        # Everything added since the first release (tables, columns, indexes, WAL)
+        # is defined once, in migrate.py
+        for change in migrate.migrate():
+            print(f"Migrated: {change}")
+
     except sqlite3.Error as e:
         print(f"SQLite error occurred: {e}")
         if 'conn' in locals():
@@ -0,0 +1,118 @@
+from fastapi import HTTPException
+from typing import Optional, List
+import sqlite3
+
+REVIEW_COUNT_SQL = '''(SELECT COUNT(*) FROM reviews r
+                 JOIN bookings b ON r.booking_id = b.id
+                 WHERE b.service_id = s.id)'''
+
+# Listing field -> SQL columns it needs (aliased so rows can be read by name)
+LISTING_COLUMNS = {
+    "id": ["s.id AS id"],
+    "title": ["s.name AS title"],
+    "description": ["s.description AS description"],
+    "price": ["s.price AS price"],
+    "originalPrice": ["s.price * 1.2 AS original_price"],
+    # The service's own rating once it has reviews, the provider's until then
+    "rating": ["COALESCE(s.rating, sp.rating) AS rating"],
+    "reviews": [f"{REVIEW_COUNT_SQL} AS review_count"],
+    "provider": [
+        "sp.id AS provider_id",
+        "sp.name AS provider_name",
+        "sp.profile_image AS provider_image"
+    ],
+    "image": []
+}
+
+LISTING_SERIALIZERS = {
+    "id": lambda s: s["id"],
+    "title": lambda s: s["title"],
+    "description": lambda s: s["description"],
+    "price": lambda s: s["price"],
+    "originalPrice": lambda s: s["original_price"],
+    "rating": lambda s: s["rating"] or 5.0,  # Default to 5 if no rating
+    "reviews": lambda s: s["review_count"] or 0,
+    "provider": lambda s: {
+        "id": s["provider_id"],
+        "name": s["provider_name"] or "Service Provider",
+        "image": s["provider_image"] or "/api/placeholder/32/32",
+        "role": "Service Provider"
+    },
+    "image": lambda s: "/api/placeholder/400/200"  # Placeholder image
+}
+
+# Fields that can only be answered by joining service_providers
+PROVIDER_FIELDS = {"rating", "provider"}
+
+def parse_fields(fields: Optional[str], allowed) -> List[str]:
+    """Turn a comma separated ?fields= value into an ordered list of known fields."""
+    requested = [f.strip() for f in (fields or "").split(",") if f.strip()]
+    if not requested:
+        return list(allowed)
+
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+
+    return [f for f in allowed if f in requested]
+
+def listing_select(fields: List[str]) -> str:
+    columns = ["s.id AS id"]
+    for field in fields:
+        for column in LISTING_COLUMNS[field]:
+            if column not in columns:
+                columns.append(column)
+    return ",\n                ".join(columns)
+
+def serialize_listing(row: sqlite3.Row, fields: List[str]) -> dict:
+    return {field: LISTING_SERIALIZERS[field](row) for field in fields}
+
+def fetch_category_listings(conn: sqlite3.Connection, category_path: str, fields: List[str]) -> List[dict]:
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+
+    provider_join = ''
+    if PROVIDER_FIELDS.intersection(fields):
+        provider_join = 'LEFT JOIN service_providers sp ON sp.id = s.provider_id'
+
+    c.execute(f'''
+        SELECT
+            {listing_select(fields)}
+        FROM services s
+        JOIN categories c ON s.category_id = c.id
+        {provider_join}
+        WHERE c.path = ?
+    ''', (category_path,))
+
+    return [serialize_listing(s, fields) for s in c.fetchall()]
+
+def fetch_featured_listings(conn: sqlite3.Connection, fields: List[str], limit: int = 10) -> List[dict]:
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+
+    # Top rated services; the ordering needs the provider join regardless of fields
+    c.execute(f'''
+        SELECT
+            {listing_select(fields)}
+        FROM services s
+        LEFT JOIN service_providers sp ON sp.id = s.provider_id
+        ORDER BY COALESCE(s.rating, sp.rating) DESC, {REVIEW_COUNT_SQL} DESC
+        LIMIT ?
+    ''', (limit,))
+
+    return [serialize_listing(s, fields) for s in c.fetchall()]
+
+# Service detail field -> services column it reads
+DETAIL_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "description": "description",
+    "price": "price",
+    "rating": "rating",
+    "created_at": "created_at",
+    "provider": None,
+    "reviews": None
+}
@@ -1,32 +1,47 @@
-from fastapi import FastAPI, HTTPException, Depends
+import warmup
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from typing import List, Optional
 import sqlite3
+import asyncio
+import heapq
+import os
+import coherence
+import migrate
+import tasks
+import suggest
+import category_snapshots
+from rate_limit import rate_limit, AdmissionControlMiddleware
 from auth import get_current_user
 from auth import router as auth_router
 from address_routes import router as address_router
-
-app = FastAPI()
-
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+from image_routes import router as image_router
+from export_routes import router as export_router
+from booking_routes import router as booking_router
+from admin_routes import router as admin_router
+from review_routes import router as review_router
+from listings import (
+    LISTING_COLUMNS, DETAIL_COLUMNS, parse_fields, fetch_featured_listings
 )
+from response_cache import cached_json_response
+from chat_archive import load_archived_messages
 
-# Include routers
-app.include_router(auth_router)
-app.include_router(address_router)
+router = APIRouter()
 
-@app.get("/")
+@router.get("/")
 async def read_root():
     return {"message": "Welcome to the Services API"}
 
-@app.get("/api/services")
-async def get_services():
+@router.get("/health")
+async def health():
+    # 503 until warm-up is done, so load balancers only route to warm workers
+    if not warmup.is_ready():
+        return JSONResponse({"status": "warming"}, status_code=503)
+    return {"status": "ready", **warmup.status()}
+
+def load_services():
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
     c.execute('SELECT * FROM services')
@@ -44,8 +59,11 @@ async def get_services():
         for s in services
     ]
 
-@app.get("/api/categories")
-async def get_categories():
+@router.get("/api/services")
+async def get_services(request: Request):
+    return cached_json_response(request, load_services)
+
+def load_categories():
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
     
@@ -73,172 +91,107 @@ async def get_categories():
     finally:
         conn.close()
 
-@app.get("/api/categories/{category_path}/services")
-async def get_category_services(category_path: str):
+@router.get("/api/categories")
+async def get_categories(request: Request):
+    return cached_json_response(request, load_categories)
+
+@router.get("/api/suggest")
+async def get_suggestions(q: str = "", limit: int = suggest.MAX_SUGGESTIONS):
+    return suggest.suggest(q, max(1, min(limit, 50)))
+
+@router.get("/api/categories/{category_path}/services")
+async def get_category_services(category_path: str, fields: Optional[str] = None):
+    selected = parse_fields(fields, LISTING_COLUMNS)
     try:
-        conn = sqlite3.connect('services.db')
-        c = conn.cursor()
-        
-        # Get services for the category along with provider details
-        c.execute('''
-            SELECT 
-                s.id,
-                s.name as title,
-                s.description,
-                s.price,
-                s.price * 1.2 as original_price,
-                sp.id as provider_id,
-                sp.name as provider_name,
-                sp.rating as provider_rating,
-                sp.profile_image as provider_image,
-                (SELECT COUNT(*) FROM reviews r 
-                 JOIN bookings b ON r.booking_id = b.id 
-                 WHERE b.service_id = s.id) as review_count
-            FROM services s
-            JOIN categories c ON s.category_id = c.id
-            LEFT JOIN service_providers sp ON sp.id = s.provider_id
-            WHERE c.path = ?
-        ''', (category_path,))
-        
-        services = c.fetchall()
-        
-        return [
-            {
-                "id": s[0],
-                "title": s[1],
-                "description": s[2],
-                "price": s[3],
-                "originalPrice": s[4],
-                "rating": s[7] or 5.0,  # Default to 5 if no rating
-                "reviews": s[9] or 0,
-                "provider": {
-                    "id": s[5],
-                    "name": s[6] or "Service Provider",
-                    "image": s[8] or "/api/placeholder/32/32",
-                    "role": "Service Provider"
-                },
-                "image": "/api/placeholder/400/200"  # Placeholder image
-            }
-            for s in services
-        ]
+        # Served from the category's snapshot, rebuilt only after that category changes
+        listing = category_snapshots.get_listing(category_path)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    
+    return [{field: s[field] for field in selected} for s in listing]
 
-@app.get("/api/featured-services")
-async def get_featured_services():
+def load_featured_services(selected: List[str]):
     try:
         conn = sqlite3.connect('services.db')
-        c = conn.cursor()
         
         # Get top rated services
-        c.execute('''
-            SELECT 
-                s.id,
-                s.name as title,
-                s.description,
-                s.price,
-                s.price * 1.2 as original_price,
-                sp.id as provider_id,
-                sp.name as provider_name,
-                sp.rating as provider_rating,
-                sp.profile_image as provider_image,
-                (SELECT COUNT(*) FROM reviews r 
-                 JOIN bookings b ON r.booking_id = b.id 
-                 WHERE b.service_id = s.id) as review_count
-            FROM services s
-            LEFT JOIN service_providers sp ON sp.id = s.provider_id
-            ORDER BY sp.rating DESC, review_count DESC
-            LIMIT 10
-        ''')
-        
-        services = c.fetchall()
-        
-        return [
-            {
-                "id": s[0],
-                "title": s[1],
-                "description": s[2],
-                "price": s[3],
-                "originalPrice": s[4],
-                "rating": s[7] or 5.0,
-                "reviews": s[9] or 0,
-                "provider": {
-                    "id": s[5],
-                    "name": s[6] or "Service Provider",
-                    "image": s[8] or "/api/placeholder/32/32",
-                    "role": "Service Provider"
-                },
-                "image": "/api/placeholder/400/200"
-            }
-            for s in services
-        ]
+        return fetch_featured_listings(conn, selected)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         conn.close()
 
-@app.get("/api/services/{service_id}")
-async def get_service_details(service_id: int):
+@router.get("/api/featured-services", dependencies=[Depends(rate_limit("featured"))])
+async def get_featured_services(request: Request, fields: Optional[str] = None):
+    selected = parse_fields(fields, LISTING_COLUMNS)
+    return cached_json_response(request, lambda: load_featured_services(selected))
+
+@router.get("/api/services/{service_id}")
+async def get_service_details(service_id: int, fields: Optional[str] = None):
+    selected = parse_fields(fields, DETAIL_COLUMNS)
+    columns = [DETAIL_COLUMNS[f] for f in selected if DETAIL_COLUMNS[f]]
+    
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
     
     # Get service details
-    c.execute('SELECT * FROM services WHERE id = ?', (service_id,))
+    c.execute(f'SELECT {", ".join(["id"] + columns)} FROM services WHERE id = ?', (service_id,))
     service = c.fetchone()
     
     if not service:
         conn.close()
         raise HTTPException(status_code=404, detail="Service not found")
     
-    # Get service provider details
-    c.execute('SELECT name, phone, profile_image, rating FROM service_providers WHERE id = ?', 
-             (service[0],))
-    provider = c.fetchone()
+    result = {column: value for column, value in zip(["id"] + columns, service)}
+    if "id" not in selected:
+        del result["id"]
     
-    # Get service reviews
-    c.execute('''
-        SELECT r.*, u.name as user_name, u.profile_image as user_avatar 
-        FROM reviews r 
-        JOIN users u ON r.user_id = u.id 
-        WHERE r.booking_id IN (
-            SELECT id FROM bookings WHERE service_id = ?
-        )
-        ORDER BY r.created_at DESC
-    ''', (service_id,))
-    reviews = c.fetchall()
-    
-    conn.close()
-    
-    return {
-        "id": service[0],
-        "name": service[1],
-        "description": service[2],
-        "price": service[3],
-        "created_at": service[4],
-        "provider": {
+    # Get service provider details
+    if "provider" in selected:
+        c.execute('SELECT name, phone, profile_image, rating FROM service_providers WHERE id = ?', 
+                 (service[0],))
+        provider = c.fetchone()
+        
+        result["provider"] = {
             "name": provider[0] if provider else None,
             "phone": provider[1] if provider else None,
             "profile_image": provider[2] if provider else None,
             "rating": provider[3] if provider else None
-        },
-        "reviews": [
+        }
+    
+    # Get service reviews
+    if "reviews" in selected:
+        c.execute('''
+            SELECT r.id, r.rating, r.comment, r.created_at, 
+                   u.name as user_name, u.profile_image as user_avatar 
+            FROM reviews r 
+            JOIN users u ON r.user_id = u.id 
+            WHERE r.booking_id IN (
+                SELECT id FROM bookings WHERE service_id = ?
+            )
+            ORDER BY r.created_at DESC
+        ''', (service_id,))
+        reviews = c.fetchall()
+        
+        result["reviews"] = [
             {
                 "id": review[0],
-                "rating": review[4],
-                "comment": review[5],
-                "created_at": review[6],
-                "user_name": review[7],
-                "user_avatar": review[8]
+                "rating": review[1],
+                "comment": review[2],
+                "created_at": review[3],
+                "user_name": review[4],
+                "user_avatar": review[5]
             }
             for review in reviews
-        ] if reviews else []
-    }
+        ]
+    
+    conn.close()
+    
+    return result
 
-@app.get("/api/bookings")
+@router.get("/api/bookings")
 async def get_user_bookings(current_user: dict = Depends(get_current_user)):
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
@@ -296,7 +249,7 @@ async def get_user_bookings(current_user: dict = Depends(get_current_user)):
             for b in bookings
         ]
 
-@app.get("/api/chats/{booking_id}")
+@router.get("/api/chats/{booking_id}")
 async def get_booking_chats(booking_id: int, current_user: dict = Depends(get_current_user)):
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
@@ -313,7 +266,10 @@ async def get_booking_chats(booking_id: int, current_user: dict = Depends(get_cu
         conn.close()
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
     
-    # Get chat messages
+    # Get chat messages, old threads are partly or fully in cold storage. Both reads
+    # share one snapshot, or a thread archived in between would be missed or doubled
+    c.execute('BEGIN')
+    archived = load_archived_messages(c, booking_id)
     c.execute('''
         SELECT * FROM chats 
         WHERE booking_id = ?
@@ -321,8 +277,12 @@ async def get_booking_chats(booking_id: int, current_user: dict = Depends(get_cu
     ''', (booking_id,))
     
     chats = c.fetchall()
+    conn.commit()
     conn.close()
     
+    if archived:
+        chats = list(heapq.merge(archived, chats, key=lambda chat: chat[5]))
+    
     return [
         {
             "id": chat[0],
@@ -334,7 +294,7 @@ async def get_booking_chats(booking_id: int, current_user: dict = Depends(get_cu
         for chat in chats
     ]
 
-@app.get("/api/services/search/{query}")
+@router.get("/api/services/search/{query}", dependencies=[Depends(rate_limit("search"))])
 async def search_services(query: str):
     conn = sqlite3.connect('services.db')
     c = conn.cursor()
@@ -364,6 +324,67 @@ async def search_services(query: str):
         for s in services
     ]
 
+def catalog_primers():
+    return {
+        "/api/services": load_services,
+        "/api/categories": load_categories,
+        "/api/featured-services": lambda: load_featured_services(list(LISTING_COLUMNS))
+    }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Databases created before a schema change are upgraded in place
+    for change in migrate.migrate():
+        print(f"Migrated services.db: {change}")
+
+    loop = asyncio.get_running_loop()
+    background = [
+        # Each worker watches the database so its caches drop writes made by the others
+        loop.create_task(coherence.poll_forever()),
+        *tasks.start_workers(),
+        # Warm caches off the event loop; /health reports when it is done
+        loop.create_task(asyncio.to_thread(warmup.warm_up, catalog_primers()))
+    ]
+    yield
+    for task in background:
+        task.cancel()
+    # Let them unwind (close connections, finish the warm-up thread) before exit
+    await asyncio.gather(*background, return_exceptions=True)
+
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+
+    # Shed load before the worker saturates (added first so CORS headers still wrap 503s)
+    app.add_middleware(AdmissionControlMiddleware)
+
+    # Enable CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Include routers
+    app.include_router(auth_router)
+    app.include_router(address_router)
+    app.include_router(image_router)
+    app.include_router(export_router)
+    app.include_router(booking_router)
+    app.include_router(admin_router)
+    app.include_router(review_router)
+    app.include_router(router)
+
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Workers are separate processes, uvicorn needs the app as an import string
+        uvicorn.run("main:create_app", factory=True, host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,226 @@
+import sqlite3
+import bcrypt
+import sys
+import analytics
+
+# Schema added after the first release. init_db.py creates the original tables and
+# then runs this, so a fresh database and an upgraded one end up the same.
+# Every statement is idempotent, so running it again (or from every worker) is safe.
+TABLES = [
+    # Cold storage, one zlib'd JSON thread per booking (chat_archive.py)
+    '''
+    CREATE TABLE IF NOT EXISTS chat_archives (
+        booking_id INTEGER PRIMARY KEY,
+        message_count INTEGER NOT NULL,
+        last_created_at DATETIME NOT NULL,
+        payload BLOB NOT NULL,
+        archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (booking_id) REFERENCES bookings(id)
+    )
+    ''',
+    # Bumped by writers so every worker drops stale caches (coherence.py)
+    '''
+    CREATE TABLE IF NOT EXISTS cache_versions (
+        name VARCHAR PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    # Durable background queue (tasks.py)
+    '''
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind VARCHAR NOT NULL,
+        payload TEXT NOT NULL,
+        status VARCHAR NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_after REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL
+    )
+    ''',
+    # Responses of recent keyed writes (idempotency.py)
+    '''
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        principal VARCHAR NOT NULL,
+        key VARCHAR NOT NULL,
+        fingerprint VARCHAR NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (principal, key)
+    ) WITHOUT ROWID
+    ''',
+    # SHA-256 of each refresh token, rotated on every refresh (auth.py)
+    '''
+    CREATE TABLE IF NOT EXISTS refresh_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token_hash VARCHAR NOT NULL UNIQUE,
+        family_id VARCHAR NOT NULL,
+        user_id INTEGER NOT NULL,
+        user_type VARCHAR NOT NULL,
+        expires_at DATETIME NOT NULL,
+        revoked_at DATETIME,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # One row per backup, so every worker sees (and respects) a running one (backup.py)
+    '''
+    CREATE TABLE IF NOT EXISTS backup_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status VARCHAR NOT NULL,
+        progress TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    '''
+]
+
+# (table, column, definition)
+COLUMNS = [
+    ('service_providers', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0'),
+    ('service_providers', 'rating_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('services', 'rating', 'FLOAT'),
+    ('services', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0'),
+    ('services', 'rating_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('bookings', 'points_awarded', 'BOOLEAN NOT NULL DEFAULT 0')
+]
+
+INDEXES = [
+    '''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_addresses_single_default
+    ON addresses (user_id) WHERE is_default = 1
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_user_created ON bookings (user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_provider_created ON bookings (provider_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_chats_booking_created ON chats (booking_id, created_at)',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_bookings_provider_status_schedule
+    ON bookings (provider_id, status, schedule_date, payment_status)
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_tasks_status_run_after ON tasks (status, run_after)',
+    'CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys (created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family ON refresh_tokens (family_id)'
+]
+
+def _has_table(cursor: sqlite3.Cursor, table: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+def _columns(cursor: sqlite3.Cursor, table: str) -> set:
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+def _rehash_admin_passwords(cursor: sqlite3.Cursor) -> int:
+    # Early databases stored the seed admin password in plain text
+    cursor.execute("SELECT id, password FROM admins WHERE password NOT LIKE '$2%'")
+    rows = cursor.fetchall()
+    for admin_id, password in rows:
+        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        cursor.execute('UPDATE admins SET password = ? WHERE id = ?', (hashed, admin_id))
+    return len(rows)
+
+# One review per booking; created only once there are no duplicates, see migrate()
+REVIEWS_INDEX = 'CREATE UNIQUE INDEX IF NOT EXISTS idx_reviews_booking ON reviews (booking_id)'
+
+def _duplicate_reviews(cursor: sqlite3.Cursor) -> int:
+    cursor.execute('''
+        SELECT COUNT(*) FROM reviews WHERE id NOT IN (SELECT MIN(id) FROM reviews GROUP BY booking_id)
+    ''')
+    return cursor.fetchone()[0]
+
+def dedupe_reviews(path: str = 'services.db') -> int:
+    """Delete all but the first review of each booking; returns how many were deleted."""
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            DELETE FROM reviews WHERE id NOT IN (SELECT MIN(id) FROM reviews GROUP BY booking_id)
+        ''')
+        deleted = cursor.rowcount
+        conn.commit()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def migrate(path: str = 'services.db') -> list:
+    """Bring an existing database up to the current schema; returns what changed.
+
+    Never deletes data: while bookings have more than one review, the unique
+    review index is left out and reported until `python migrate.py --dedupe-reviews`.
+    """
+    conn = sqlite3.connect(path)
+    changes = []
+    try:
+        cursor = conn.cursor()
+        # Must run outside a transaction; a no-op once the file is in WAL mode
+        if cursor.execute('PRAGMA journal_mode=WAL').fetchone()[0] != 'wal':
+            print("Could not switch services.db to WAL")
+
+        # Serializes workers that start at the same time
+        cursor.execute('BEGIN IMMEDIATE')
+        needs_rollups = not _has_table(cursor, 'booking_rollups')
+        # Maintained by analytics.py as bookings change status
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS booking_rollups (
+                day DATE NOT NULL,
+                category_id INTEGER NOT NULL,
+                provider_id INTEGER NOT NULL,
+                status VARCHAR NOT NULL,
+                booking_count INTEGER NOT NULL DEFAULT 0,
+                revenue FLOAT NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, category_id, provider_id, status)
+            ) WITHOUT ROWID
+        ''')
+        for sql in TABLES:
+            cursor.execute(sql)
+
+        for table, column, definition in COLUMNS:
+            if column not in _columns(cursor, table):
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                changes.append(f"added {table}.{column}")
+
+        duplicates = _duplicate_reviews(cursor)
+        if duplicates:
+            changes.append(f"skipped idx_reviews_booking: {duplicates} duplicate reviews, "
+                           "run python migrate.py --dedupe-reviews")
+        else:
+            cursor.execute(REVIEWS_INDEX)
+
+        # The single-default index would fail on rows written before it existed; only
+        # the flag changes, every address is kept
+        cursor.execute('''
+            UPDATE addresses SET is_default = 0
+            WHERE is_default = 1
+              AND id NOT IN (SELECT MIN(id) FROM addresses WHERE is_default = 1 GROUP BY user_id)
+        ''')
+        if cursor.rowcount:
+            changes.append(f"demoted {cursor.rowcount} extra default addresses")
+
+        for sql in INDEXES:
+            cursor.execute(sql)
+
+        rehashed = _rehash_admin_passwords(cursor)
+        if rehashed:
+            changes.append(f"hashed {rehashed} admin passwords")
+        conn.commit()
+
+        if needs_rollups:
+            # Bookings made before rollups existed
+            changes.append(f"backfilled {analytics.backfill(conn)} rollup rows")
+        return changes
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--dedupe-reviews"]:
+        print(f"Deleted {dedupe_reviews()} duplicate reviews")
+    elif sys.argv[1:]:
+        print("Usage: python migrate.py [--dedupe-reviews]")
+        sys.exit(1)
+    changes = migrate()
+    print("\n".join(changes) if changes else "Schema is up to date")
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from typing import Optional
+import threading
+import sqlite3
+import time
+import coherence
+
+MAX_ENTRIES = 10000
+PROFILE_TTL = 60
+# One coherence namespace per principal, e.g. "profile:provider:7"
+NAMESPACE_PREFIX = "profile:"
+
+# (user_type, user_id) -> (profile, cached_at)
+_profiles = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+# Invalidations also arrive from worker threads (e.g. task handlers via coherence.publish)
+_lock = threading.Lock()
+
+def get(user_type: str, user_id: int) -> Optional[dict]:
+    key = (user_type, user_id)
+    with _lock:
+        entry = _profiles.get(key)
+        if entry is None or entry[1] < time.monotonic() - PROFILE_TTL:
+            _stats["misses"] += 1
+            return None
+        _profiles.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[0]
+
+def put(user_type: str, user_id: int, profile: dict):
+    with _lock:
+        _profiles[(user_type, user_id)] = (profile, time.monotonic())
+        _profiles.move_to_end((user_type, user_id))
+        while len(_profiles) > MAX_ENTRIES:
+            _profiles.popitem(last=False)
+            _stats["evictions"] += 1
+
+def _invalidate(namespace: str):
+    user_type, _, user_id = namespace[len(NAMESPACE_PREFIX):].partition(":")
+    with _lock:
+        if _profiles.pop((user_type, int(user_id)), None) is not None:
+            _stats["invalidations"] += 1
+
+coherence.register_prefix(NAMESPACE_PREFIX, _invalidate)
+
+def invalidate(user_type: str, user_id: int, conn: Optional[sqlite3.Connection] = None):
+    """Drop one cached profile in every worker; pass the writer's connection to bump in its transaction."""
+    coherence.publish(f"{NAMESPACE_PREFIX}{user_type}:{user_id}", conn)
+
+def metrics() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "size": len(_profiles),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0,
+            **_stats
+        }
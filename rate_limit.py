@@ -0,0 +1,122 @@
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+import math
+import time
+import jwt
+
+# Route class -> (bucket capacity, tokens refilled per second)
+ROUTE_LIMITS = {
+    "auth": (5, 5 / 60),       # bcrypt logins
+    "search": (20, 5),         # LIKE scans over services
+    "featured": (30, 10)
+}
+
+# Path prefix -> priority; low priority requests are shed first under load
+LOW_PRIORITY_PREFIXES = (
+    "/api/services/search",
+    "/api/featured-services",
+    "/api/categories",
+    "/api/placeholder",
+    "/api/images"
+)
+
+# In-flight requests at which low priority traffic is shed, and at which everything is
+SOFT_CONCURRENCY_LIMIT = 64
+HARD_CONCURRENCY_LIMIT = 128
+SHED_RETRY_AFTER = 1
+
+IDLE_BUCKET_TTL = 300
+EVICT_INTERVAL = 60
+
+class TokenBuckets:
+    """Token buckets for one route class, stored as key -> [tokens, last_refill]."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.buckets = {}
+        self.next_eviction = time.monotonic() + EVICT_INTERVAL
+
+    def acquire(self, key: str) -> float:
+        """Take one token for `key`; returns 0 on success or seconds until one is available."""
+        now = time.monotonic()
+        if now >= self.next_eviction:
+            self.evict(now)
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.capacity, now]
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / self.rate
+
+    def evict(self, now: float):
+        # An idle bucket has refilled completely, forgetting it changes nothing
+        cutoff = now - IDLE_BUCKET_TTL
+        self.buckets = {k: b for k, b in self.buckets.items() if b[1] >= cutoff}
+        self.next_eviction = now + EVICT_INTERVAL
+
+_limiters = {name: TokenBuckets(*limit) for name, limit in ROUTE_LIMITS.items()}
+
+def client_key(request: Request) -> str:
+    # Authenticated callers are limited per principal, everyone else per IP
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        # auth applies these limits to its login routes, so import it late
+        import auth
+        try:
+            payload = jwt.decode(authorization[7:], auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+            return f"{payload.get('type')}:{payload.get('sub')}"
+        except jwt.PyJWTError:
+            # A stale or forged token never fails a public endpoint
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def rate_limit(route_class: str):
+    """Dependency limiting a route to its class' token bucket per client."""
+    limiter = _limiters[route_class]
+
+    async def check(request: Request):
+        retry_after = limiter.acquire(client_key(request))
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+    return check
+
+class AdmissionControlMiddleware:
+    """Caps in-flight requests, shedding low priority paths before latency collapses."""
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        low_priority = scope["path"].startswith(LOW_PRIORITY_PREFIXES)
+        limit = SOFT_CONCURRENCY_LIMIT if low_priority else HARD_CONCURRENCY_LIMIT
+        if self.in_flight >= limit:
+            response = JSONResponse(
+                {"detail": "Server busy, retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(SHED_RETRY_AFTER)}
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,112 @@
+from fastapi import Request, Response
+from collections import OrderedDict
+from typing import Callable
+import threading
+import gzip
+import json
+import coherence
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, we fall back to gzip
+    brotli = None
+
+# Bodies smaller than this are sent as-is, compressing them costs more than it saves
+MIN_COMPRESS_SIZE = 1024
+MAX_CACHE_ENTRIES = 256
+
+_catalog_version = 0
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def catalog_version() -> int:
+    return _catalog_version
+
+def bump_catalog_version():
+    """Drop this worker's cached bodies.
+
+    Writers should call coherence.publish("catalog") instead, which runs this
+    in every worker.
+    """
+    global _catalog_version
+    with _lock:
+        _catalog_version += 1
+        _cache.clear()
+
+coherence.register("catalog", bump_catalog_version)
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    candidates = ["br", "gzip"] if brotli else ["gzip"]
+    best = max(candidates, key=lambda enc: weights.get(enc, weights.get("*", 0.0)))
+    if weights.get(best, weights.get("*", 0.0)) > 0:
+        return best
+    return "identity"
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+def _cache_key(path: str, params: tuple = ()):
+    return (path, params, _catalog_version)
+
+def _cached_bodies(key: tuple, build: Callable[[], object]) -> dict:
+    with _lock:
+        bodies = _cache.get(key)
+        if bodies is not None:
+            _cache.move_to_end(key)
+            return bodies
+
+    body = json.dumps(build(), separators=(",", ":")).encode("utf-8")
+    bodies = {"identity": body}
+    with _lock:
+        # Only store if no write happened while we were building
+        if key[2] == _catalog_version:
+            _cache[key] = bodies
+            while len(_cache) > MAX_CACHE_ENTRIES:
+                _cache.popitem(last=False)
+    return bodies
+
+def prime(path: str, build: Callable[[], object]):
+    """Fill the cache for `path` without query parameters, compressed in every encoding."""
+    bodies = _cached_bodies(_cache_key(path), build)
+    if len(bodies["identity"]) >= MIN_COMPRESS_SIZE:
+        for encoding in (["br", "gzip"] if brotli else ["gzip"]):
+            bodies.setdefault(encoding, _compress(bodies["identity"], encoding))
+
+def cached_json_response(request: Request, build: Callable[[], object]) -> Response:
+    """Serve a catalog payload from the precompressed cache, building it on a miss.
+
+    `build` is only called when there is no cached body for this endpoint,
+    query string and catalog version.
+    """
+    params = tuple(sorted(request.query_params.multi_items()))
+    bodies = _cached_bodies(_cache_key(request.url.path, params), build)
+
+    encoding = "identity"
+    if len(bodies["identity"]) >= MIN_COMPRESS_SIZE:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+
+    if encoding not in bodies:
+        bodies[encoding] = _compress(bodies["identity"], encoding)
+
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=bodies[encoding], media_type="application/json", headers=headers)
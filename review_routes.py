@@ -0,0 +1,123 @@
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
+from typing import Optional
+import sqlite3
+from auth import get_current_user
+from init_db import BookingStatus
+import coherence
+import profile_cache
+import category_snapshots
+import tasks
+
+router = APIRouter(prefix="/api")
+
+# Bayesian smoothing: every rating starts as RATING_PRIOR_WEIGHT virtual reviews of
+# RATING_PRIOR_MEAN, so one 5-star review doesn't top the featured list. 0 disables it.
+# Rows that already have a rating (seeded providers) use it as their prior instead.
+RATING_PRIOR_MEAN = 4.0
+RATING_PRIOR_WEIGHT = 5
+
+class ReviewCreate(BaseModel):
+    rating: int
+    comment: Optional[str] = None
+
+def _apply_rating(cursor: sqlite3.Cursor, table: str, row_id: int, rating: int,
+                  prior_mean: float = RATING_PRIOR_MEAN):
+    # rating * (W + count) is the prior plus every review so far, so the running
+    # average keeps a seeded rating; unrated rows (NULL, or the 0 default) start at prior_mean
+    cursor.execute(f'''
+        UPDATE {table}
+        SET rating_sum = rating_sum + ?,
+            rating_count = rating_count + 1,
+            rating = CASE
+                WHEN rating IS NULL OR (rating_count = 0 AND rating = 0)
+                    THEN (? * ? + ?) / (? + 1.0)
+                ELSE (rating * (? + rating_count) + ?) / (? + rating_count + 1.0)
+            END
+        WHERE id = ?
+    ''', (
+        rating,
+        prior_mean, RATING_PRIOR_WEIGHT, rating, RATING_PRIOR_WEIGHT,
+        RATING_PRIOR_WEIGHT, rating, RATING_PRIOR_WEIGHT,
+        row_id
+    ))
+
+@router.post("/bookings/{booking_id}/review")
+async def create_review(
+    booking_id: int,
+    review: ReviewCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["user_type"] != "user":
+        raise HTTPException(status_code=403, detail="Only users can review bookings")
+    if not 1 <= review.rating <= 5:
+        raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
+
+    conn = sqlite3.connect('services.db')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+
+        cursor.execute('''
+            SELECT service_id, provider_id, status FROM bookings
+            WHERE id = ? AND user_id = ?
+        ''', (booking_id, current_user["user_id"]))
+        booking = cursor.fetchone()
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
+        if booking[2] != BookingStatus.COMPLETED.value:
+            raise HTTPException(status_code=400, detail="Only completed bookings can be reviewed")
+
+        service_id, provider_id = booking[0], booking[1]
+        try:
+            cursor.execute('''
+                INSERT INTO reviews (booking_id, user_id, provider_id, rating, comment)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (booking_id, current_user["user_id"], provider_id, review.rating, review.comment))
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=400, detail="Booking already reviewed")
+        review_id = cursor.lastrowid
+
+        # Running aggregates, so ratings never need a pass over reviews
+        # Listings show a service's provider rating until it has its own, so that is its prior
+        cursor.execute('SELECT rating FROM service_providers WHERE id = ?', (provider_id,))
+        provider = cursor.fetchone()
+        _apply_rating(cursor, "services", service_id, review.rating,
+                      (provider and provider[0]) or RATING_PRIOR_MEAN)
+        _apply_rating(cursor, "service_providers", provider_id, review.rating)
+
+        tasks.enqueue(cursor, "review_posted", {
+            "review_id": review_id,
+            "booking_id": booking_id,
+            "provider_id": provider_id,
+            "rating": review.rating
+        })
+        # Listings show ratings and review counts, provider profiles show the rating
+        coherence.publish("catalog", conn)
+        category_snapshots.publish_service(conn, service_id)
+        category_snapshots.publish_provider(conn, provider_id)
+        profile_cache.invalidate("provider", provider_id, conn)
+
+        conn.commit()
+        return {
+            "id": review_id,
+            "booking_id": booking_id,
+            "rating": review.rating,
+            "comment": review.comment
+        }
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+@tasks.task_handler("review_posted")
+def notify_review_posted(conn: sqlite3.Connection, reviews: list):
+    conn.executemany('''
+        INSERT INTO notifications (provider_id, booking_id, message)
+        VALUES (?, ?, ?)
+    ''', [
+        (review["provider_id"], review["booking_id"],
+         f"You received a {review['rating']}-star review for booking #{review['booking_id']}")
+        for review in reviews
+    ])
@@ -0,0 +1,157 @@
+from bisect import bisect_left, insort
+from typing import List
+import heapq
+import sqlite3
+import coherence
+
+MAX_SUGGESTIONS = 10
+# Upper bound on index entries inspected per query, keeps one-letter prefixes cheap
+MAX_SCAN = 1000
+# Published per service, so one write re-indexes one service rather than rebuilding
+NAMESPACE_PREFIX = "suggest:service:"
+
+class PrefixIndex:
+    """Sorted (term, item) pairs searched with bisect.
+
+    Every word-suffix of a name is indexed ("pipe repair" and "repair"), so a
+    prefix of any word in the name matches.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.items = {}
+
+    @staticmethod
+    def terms(*texts) -> set:
+        terms = set()
+        for text in texts:
+            words = (text or "").lower().replace("-", " ").split()
+            for i in range(len(words)):
+                terms.add(" ".join(words[i:]))
+        return terms
+
+    def add(self, item_key: tuple, item: dict, *texts, keep_sorted: bool = True):
+        self.items[item_key] = item
+        for term in self.terms(*texts):
+            if keep_sorted:
+                insort(self.keys, (term, item_key))
+            else:
+                self.keys.append((term, item_key))
+
+    def remove(self, item_key: tuple):
+        item = self.items.pop(item_key, None)
+        if item is None:
+            return
+        self.keys = [entry for entry in self.keys if entry[1] != item_key]
+
+    def search(self, prefix: str, limit: int) -> List[dict]:
+        prefix = " ".join(prefix.lower().replace("-", " ").split())
+        if not prefix:
+            return []
+
+        matches = set()
+        start = bisect_left(self.keys, (prefix,))
+        for term, item_key in self.keys[start:start + MAX_SCAN]:
+            if not term.startswith(prefix):
+                break
+            matches.add(item_key)
+
+        # Most popular first, shorter labels win ties
+        best = heapq.nlargest(
+            limit, matches,
+            key=lambda k: (self.items[k]["weight"], -len(self.items[k]["label"]))
+        )
+        return [self.items[k] for k in best]
+
+_index = None
+
+def _service_item(row) -> dict:
+    return {"type": "service", "id": row[0], "label": row[1], "path": row[2], "weight": row[3]}
+
+SERVICE_SQL = '''
+    SELECT s.id, s.name, c.path,
+           (SELECT COUNT(*) FROM bookings b WHERE b.service_id = s.id) AS popularity
+    FROM services s
+    LEFT JOIN categories c ON s.category_id = c.id
+'''
+
+def build_index(conn: sqlite3.Connection) -> PrefixIndex:
+    index = PrefixIndex()
+    c = conn.cursor()
+
+    c.execute(SERVICE_SQL)
+    category_weights = {}
+    for row in c.fetchall():
+        index.add(("service", row[0]), _service_item(row), row[1], keep_sorted=False)
+        category_weights[row[2]] = category_weights.get(row[2], 0) + row[3] + 1
+
+    c.execute('SELECT id, name, path FROM categories')
+    for category_id, name, path in c.fetchall():
+        item = {
+            "type": "category",
+            "id": category_id,
+            "label": name,
+            "path": path,
+            "weight": category_weights.get(path, 0)
+        }
+        index.add(("category", category_id), item, name, path, keep_sorted=False)
+
+    # One sort for the whole build instead of an insort per term
+    index.keys.sort()
+    return index
+
+def get_index() -> PrefixIndex:
+    global _index
+    if _index is None:
+        conn = sqlite3.connect('services.db')
+        try:
+            _index = build_index(conn)
+        finally:
+            conn.close()
+    return _index
+
+def _refresh_category_weight(conn: sqlite3.Connection, path: str):
+    # Same sum as build_index, over the services of this one category
+    rows = conn.execute(SERVICE_SQL + ' WHERE c.path = ?', (path,)).fetchall()
+    weight = sum(row[3] + 1 for row in rows)
+    for (category_id,) in conn.execute('SELECT id FROM categories WHERE path = ?', (path,)):
+        item = _index.items.get(("category", category_id))
+        if item is not None:
+            # Replaced rather than mutated, results already handed out keep their values
+            _index.items[("category", category_id)] = {**item, "weight": weight}
+
+def refresh_service(conn: sqlite3.Connection, service_id: int):
+    """Re-index one service and the weight of its category after it is created,
+    renamed, moved or its popularity changes."""
+    if _index is None:
+        return
+    old = _index.items.get(("service", service_id))
+    _index.remove(("service", service_id))
+    row = conn.execute(SERVICE_SQL + ' WHERE s.id = ?', (service_id,)).fetchone()
+    if row:
+        _index.add(("service", service_id), _service_item(row), row[1])
+
+    # Both categories when the service moved
+    paths = {old["path"] if old else None, row[2] if row else None}
+    for path in paths - {None}:
+        _refresh_category_weight(conn, path)
+
+def _refresh_published(namespace: str):
+    conn = sqlite3.connect('services.db')
+    try:
+        refresh_service(conn, int(namespace[len(NAMESPACE_PREFIX):]))
+    finally:
+        conn.close()
+
+coherence.register_prefix(NAMESPACE_PREFIX, _refresh_published)
+
+def publish_service(conn: sqlite3.Connection, service_id: int):
+    """Re-index a service in every worker once the writer's transaction commits.
+
+    Call it from writes that create or rename a service or add bookings to it;
+    nothing else in a suggestion (ratings, prices) is indexed.
+    """
+    coherence.publish(f"{NAMESPACE_PREFIX}{service_id}", conn)
+
+def suggest(q: str, limit: int = MAX_SUGGESTIONS) -> List[dict]:
+    return get_index().search(q, limit)
@@ -0,0 +1,176 @@
+from typing import Callable, Dict, List, Optional
+import asyncio
+import sqlite3
+import json
+import time
+
+BATCH_SIZE = 50
+# A claimed batch not finished within this many seconds is picked up again (worker died)
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = 300
+IDLE_POLL_INTERVAL = 1.0
+WORKER_COUNT = 2
+
+# Task kind -> handler(conn, payloads); a handler receives a whole batch of one kind
+_handlers: Dict[str, Callable[[sqlite3.Connection, List[dict]], None]] = {}
+_wakeup = None
+_stats = {"processed": 0, "failed": 0, "retried": 0}
+
+def task_handler(kind: str):
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+def enqueue(cursor: sqlite3.Cursor, kind: str, payload: dict, delay: float = 0):
+    """Queue a task inside the caller's transaction, so it exists only if the write commits."""
+    now = time.time()
+    cursor.execute('''
+        INSERT INTO tasks (kind, payload, run_after, created_at)
+        VALUES (?, ?, ?, ?)
+    ''', (kind, json.dumps(payload), now + delay, now))
+    if _wakeup is not None:
+        _wakeup.set()
+
+def _claim_batch(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        now = time.time()
+        cursor.execute('''
+            SELECT kind FROM tasks
+            WHERE status IN ('pending', 'running') AND run_after <= ?
+            ORDER BY run_after
+            LIMIT 1
+        ''', (now,))
+        row = cursor.fetchone()
+        if not row:
+            conn.commit()
+            return None, []
+
+        kind = row[0]
+        cursor.execute('''
+            SELECT id, payload, attempts FROM tasks
+            WHERE status IN ('pending', 'running') AND run_after <= ? AND kind = ?
+            ORDER BY run_after
+            LIMIT ?
+        ''', (now, kind, BATCH_SIZE))
+        batch = cursor.fetchall()
+        cursor.executemany('''
+            UPDATE tasks SET status = 'running', run_after = ? WHERE id = ?
+        ''', [(now + LEASE_SECONDS, task[0]) for task in batch])
+        conn.commit()
+        return kind, batch
+    except Exception:
+        conn.rollback()
+        raise
+
+def _try_batch(kind: str, batch: list) -> Optional[Exception]:
+    """Run a batch and delete its tasks in one transaction; returns the error, if any."""
+    conn = sqlite3.connect('services.db')
+    try:
+        handler = _handlers.get(kind)
+        if handler is None:
+            raise LookupError(f"No handler for task kind {kind}")
+        handler(conn, [json.loads(task[1]) for task in batch])
+        conn.execute('DELETE FROM tasks WHERE id IN (%s)' % ",".join("?" * len(batch)),
+                     [task[0] for task in batch])
+        conn.commit()
+        return None
+    except Exception as e:
+        conn.rollback()
+        return e
+    finally:
+        conn.close()
+
+def _record_failure(task: tuple, error: Exception):
+    task_id, _, attempts = task
+    attempts += 1
+    if attempts >= MAX_ATTEMPTS:
+        _stats["failed"] += 1
+        status, run_after = 'failed', time.time()
+    else:
+        _stats["retried"] += 1
+        status, run_after = 'pending', time.time() + min(MAX_BACKOFF, 2 ** attempts)
+
+    conn = sqlite3.connect('services.db')
+    try:
+        conn.execute('''
+            UPDATE tasks SET status = ?, attempts = ?, run_after = ?, last_error = ?
+            WHERE id = ?
+        ''', (status, attempts, run_after, str(error), task_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _run_batch(kind: str, batch: list):
+    error = _try_batch(kind, batch)
+    if error is None:
+        _stats["processed"] += len(batch)
+        return
+
+    print(f"Task batch {kind} ({len(batch)} tasks) failed: {error}")
+    if len(batch) > 1:
+        # Rerun one by one, so only the bad task uses up its attempts
+        for task in batch:
+            _run_batch(kind, [task])
+        return
+    _record_failure(batch[0], error)
+
+async def _worker():
+    # Claims run in a thread (BEGIN IMMEDIATE can wait on a writer), hence check_same_thread
+    conn = sqlite3.connect('services.db', check_same_thread=False)
+    try:
+        while True:
+            try:
+                kind, batch = await asyncio.to_thread(_claim_batch, conn)
+            except sqlite3.Error as e:
+                print(f"Task queue poll failed: {e}")
+                kind, batch = None, []
+
+            if batch:
+                try:
+                    await asyncio.to_thread(_run_batch, kind, batch)
+                except Exception as e:
+                    # e.g. the database was locked while recording a failure; the
+                    # lease runs out and the tasks are claimed again
+                    print(f"Task batch {kind} could not be completed: {e}")
+                continue
+
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), IDLE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        conn.close()
+
+def start_workers(count: int = WORKER_COUNT):
+    global _wakeup
+    _wakeup = asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    return [loop.create_task(_worker()) for _ in range(count)]
+
+def queue_metrics() -> dict:
+    conn = sqlite3.connect('services.db')
+    try:
+        c = conn.cursor()
+        c.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status')
+        counts = dict(c.fetchall())
+        c.execute('''
+            SELECT MIN(run_after) FROM tasks WHERE status = 'pending' AND run_after <= ?
+        ''', (time.time(),))
+        oldest_due = c.fetchone()[0]
+    finally:
+        conn.close()
+
+    return {
+        "pending": counts.get("pending", 0),
+        "running": counts.get("running", 0),
+        "failed": counts.get("failed", 0),
+        # Seconds the oldest due task has been waiting for a worker
+        "lag_seconds": round(time.time() - oldest_due, 3) if oldest_due else 0,
+        **_stats
+    }
@@ -0,0 +1,95 @@
+from typing import Callable, Dict
+import time
+import os
+
+def _process_started() -> float:
+    """time.monotonic() at which this process started, read from /proc where available."""
+    now = time.monotonic()
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22, in clock ticks since boot; the name in field 2 may contain spaces
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return now - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        # Imported first by main, before the modules below pull in FastAPI
+        return now
+
+# Includes interpreter startup and every import, not just the time since this line
+PROCESS_STARTED = _process_started()
+
+import sqlite3
+import category_snapshots
+import response_cache
+import suggest
+
+# Run once so the schema is parsed and the hot table and index pages are in the
+# OS page cache. Connections are per request, so there is no statement cache to fill.
+HOT_STATEMENTS = [
+    "SELECT COUNT(*) FROM categories",
+    "SELECT COUNT(*) FROM services",
+    "SELECT COUNT(*) FROM service_providers WHERE email > ''",
+    "SELECT COUNT(*) FROM users WHERE email > ''",
+    "SELECT COUNT(*) FROM bookings WHERE provider_id > 0",
+    "SELECT COUNT(*) FROM bookings WHERE user_id > 0",
+    "SELECT COUNT(*) FROM reviews WHERE booking_id > 0",
+    "SELECT COUNT(*) FROM addresses WHERE user_id > 0"
+]
+
+_state = {"ready": False}
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+def status() -> dict:
+    return dict(_state)
+
+def _timed(timings: dict, step: str, func: Callable[[], None]):
+    started = time.monotonic()
+    try:
+        func()
+    except Exception as e:
+        # A cold cache is slower, not broken; serve anyway (primers raise HTTPException too)
+        print(f"Warm-up step {step} failed: {e!r}")
+    timings[step] = round(time.monotonic() - started, 4)
+
+def _touch_pages():
+    conn = sqlite3.connect('services.db')
+    try:
+        for sql in HOT_STATEMENTS:
+            try:
+                conn.execute(sql).fetchone()
+            except sqlite3.Error as e:
+                print(f"Warm-up query failed: {e}")
+    finally:
+        conn.close()
+
+def _load_category_snapshots():
+    conn = sqlite3.connect('services.db')
+    try:
+        paths = [row[0] for row in conn.execute('SELECT path FROM categories')]
+    finally:
+        conn.close()
+    for path in paths:
+        category_snapshots.get_listing(path)
+
+def warm_up(catalog_primers: Dict[str, Callable[[], object]]) -> dict:
+    """Fill caches and the page cache, then mark the worker ready.
+
+    `catalog_primers` maps catalog paths to the functions that build their payloads.
+    """
+    timings = {}
+    _timed(timings, "pages", _touch_pages)
+    for path, build in catalog_primers.items():
+        _timed(timings, path, lambda: response_cache.prime(path, build))
+    _timed(timings, "category_snapshots", _load_category_snapshots)
+    _timed(timings, "suggest_index", suggest.get_index)
+
+    _state.update(
+        ready=True,
+        timings=timings,
+        ready_after_seconds=round(time.monotonic() - PROCESS_STARTED, 3)
+    )
+    print(f"Worker ready after {_state['ready_after_seconds']}s")
+    return status()